@@ -1,6 +1,6 @@
 {
     'name': 'Guatemala EDI - Adenda Personalizada',
-    'version': '19.0.4.0.0',
+    'version': '19.0.4.3.0',
     'category': 'Accounting/Localizations/EDI',
     'summary': 'Adenda personalizada, certificación al confirmar, frases por journal y anulación FEL',
     'description': """
@@ -15,6 +15,7 @@
         - Datos de Receptor (CorreoReceptor, DireccionReceptor)
         - Auto-llenado de invoice_series e invoice_number desde respuesta INFILE
         - Anulación de facturas FEL directamente en INFILE
+        - Cola de certificación FEL en segundo plano con reintentos
     """,
     'author': 'ADROC',
     'website': 'https://www.adroc.com.gt',
@@ -29,10 +30,15 @@
         'security/ir.model.access.csv',
         'data/templates.xml',
         'data/server_actions.xml',
+        'data/ir_cron.xml',
         'wizards/l10n_gt_edi_cancel_wizard_views.xml',
         'wizards/l10n_gt_edi_confirm_wizard_views.xml',
+        'views/account_fiscal_position_views.xml',
         'views/account_journal_views.xml',
         'views/account_move_views.xml',
+        'views/l10n_gt_edi_certification_job_views.xml',
+        'views/res_company_views.xml',
+        'views/l10n_gt_edi_send_metric_views.xml',
     ],
     'installable': True,
     'auto_install': False,
@@ -0,0 +1,24 @@
+from odoo import http
+from odoo.http import content_disposition, request
+
+from ..models.utils import _l10n_gt_edi_pretty_xml
+
+
+class L10nGtEdiDocumentController(http.Controller):
+
+    @http.route('/l10n_gt_edi/document/<int:document_id>/xml', type='http', auth='user')
+    def download_document_xml(self, document_id):
+        """Descarga el XML del documento FEL indentado (se guarda compacto)."""
+        document = request.env['l10n_gt_edi.document'].browse(document_id).exists()
+        if not document:
+            raise request.not_found()
+        document.check_access('read')
+        attachment = document.sudo().attachment_id
+        if not attachment:
+            raise request.not_found()
+        content = _l10n_gt_edi_pretty_xml(attachment.raw)
+        return request.make_response(content, headers=[
+            ('Content-Type', 'application/xml; charset=utf-8'),
+            ('Content-Length', len(content)),
+            ('Content-Disposition', content_disposition(attachment.name or f'{document.uuid or document.id}.xml')),
+        ])
@@ -0,0 +1,17 @@
+import logging
+
+
+def migrate(cr, version):
+    """Inicializa l10n_gt_edi_current_document_id para las facturas existentes."""
+    cr.execute("""
+        UPDATE account_move move
+           SET l10n_gt_edi_current_document_id = current.document_id
+          FROM (
+                SELECT DISTINCT ON (invoice_id) invoice_id, id AS document_id
+                  FROM l10n_gt_edi_document
+                 WHERE state IN ('invoice_sent', 'invoice_cancelled')
+              ORDER BY invoice_id, id DESC
+               ) current
+         WHERE move.id = current.invoice_id
+    """)
+    logging.info("FEL: Documento vigente inicializado en %s facturas", cr.rowcount)
@@ -0,0 +1,34 @@
+import logging
+
+
+def migrate(cr, version):
+    """
+    Marca como exportación las posiciones fiscales que cumplían la heurística anterior
+    (sin país o con nombre Foreign/Extranjero/Exporta) en compañías de Guatemala, y
+    sincroniza is_export_invoice en las facturas existentes.
+    """
+    cr.execute("""
+        UPDATE account_fiscal_position fp
+           SET l10n_gt_edi_is_export = TRUE
+          FROM res_company company
+          JOIN res_country country ON country.id = company.account_fiscal_country_id
+         WHERE fp.company_id = company.id
+           AND country.code = 'GT'
+           AND (
+                fp.country_id IS NULL
+                OR fp.name::text ILIKE '%%foreign%%'
+                OR fp.name::text ILIKE '%%extranjero%%'
+                OR fp.name::text ILIKE '%%exporta%%'
+           )
+    """)
+    logging.info("FEL: %s posiciones fiscales marcadas como exportación", cr.rowcount)
+
+    cr.execute("""
+        UPDATE account_move move
+           SET is_export_invoice = COALESCE(fp.l10n_gt_edi_is_export, FALSE)
+          FROM account_move m
+     LEFT JOIN account_fiscal_position fp ON fp.id = m.fiscal_position_id
+         WHERE move.id = m.id
+           AND move.is_export_invoice IS DISTINCT FROM COALESCE(fp.l10n_gt_edi_is_export, FALSE)
+    """)
+    logging.info("FEL: is_export_invoice sincronizado en %s facturas", cr.rowcount)
@@ -0,0 +1,44 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import SQL, split_every
+from odoo.tools.sql import column_exists
+
+
+def migrate(cr, version):
+    """
+    Calcula l10n_gt_edi_pending_certification solo para las candidatas: facturas de
+    cliente publicadas de compañías de Guatemala sin documento FEL certificado o
+    anulado ni UUID del módulo legacy (fel_gt/fel_infile). Las que solo tienen
+    envíos fallidos son candidatas: el compute decide, igual que en una factura nueva.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    legacy_conditions = [
+        SQL("COALESCE(move.%s::varchar, '') = ''", SQL.identifier(fname))
+        for fname in env['account.move']._l10n_gt_edi_get_legacy_uuid_fields()
+        if column_exists(cr, 'account_move', fname)
+    ]
+    cr.execute(SQL("""
+        SELECT move.id
+          FROM account_move move
+          JOIN res_company company ON company.id = move.company_id
+          JOIN res_country country ON country.id = company.account_fiscal_country_id
+         WHERE country.code = 'GT'
+           AND move.state = 'posted'
+           AND move.move_type IN ('out_invoice', 'out_refund')
+           AND NOT EXISTS (
+                SELECT 1
+                  FROM l10n_gt_edi_document doc
+                 WHERE doc.invoice_id = move.id
+                   AND doc.state != 'invoice_sending_failed'
+           )
+           AND %s
+    """, SQL(" AND ").join(legacy_conditions) if legacy_conditions else SQL("TRUE")))
+    move_ids = [row[0] for row in cr.fetchall()]
+    field = env['account.move']._fields['l10n_gt_edi_pending_certification']
+    for chunk in split_every(1000, move_ids):
+        env.add_to_compute(field, env['account.move'].browse(chunk))
+        env.flush_all()
+        env.invalidate_all()
+    cr.execute("SELECT COUNT(*) FROM account_move WHERE l10n_gt_edi_pending_certification")
+    logging.info("FEL: %s facturas pendientes de certificar (de %s candidatas)", cr.fetchone()[0], len(move_ids))
@@ -0,0 +1,9 @@
+def migrate(cr, version):
+    """
+    Crea la columna l10n_gt_edi_pending_certification vacía para que la actualización
+    no la calcule en Python sobre todas las facturas (ver post-migrate).
+    """
+    cr.execute("""
+        ALTER TABLE account_move
+        ADD COLUMN IF NOT EXISTS l10n_gt_edi_pending_certification BOOLEAN
+    """)
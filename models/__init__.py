@@ -1,4 +1,11 @@
+from . import account_fiscal_position
 from . import account_journal
 from . import account_move
 from . import l10n_gt_edi_document
 from . import fel_infile_certificar_wizard
+from . import l10n_gt_edi_certification_job
+from . import l10n_gt_edi_rate_bucket
+from . import res_company
+from . import l10n_gt_edi_send_metric
+from . import res_partner
+from . import l10n_gt_edi_phrase
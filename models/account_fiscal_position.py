@@ -0,0 +1,11 @@
+from odoo import fields, models
+
+
+class AccountFiscalPosition(models.Model):
+    _inherit = 'account.fiscal.position'
+
+    l10n_gt_edi_is_export = fields.Boolean(
+        string="Exportación FEL",
+        help="Las facturas con esta posición fiscal se certifican como exportación "
+             "(complemento de exportación en el XML FEL).",
+    )
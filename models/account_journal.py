@@ -35,3 +35,15 @@ class AccountJournal(models.Model):
         help="Si está activo, las facturas de este diario se certificarán "
              "automáticamente en FEL al momento de confirmar.",
     )
+    l10n_gt_edi_certify_async = fields.Boolean(
+        string="Certificar FEL en Segundo Plano",
+        default=False,
+        help="Si está activo, al confirmar solo se encola la certificación FEL y "
+             "un proceso programado la envía a INFILE, con reintentos automáticos.",
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'l10n_gt_edi_phrase_ids', 'l10n_gt_edi_use_journal_phrases', 'company_id'}.intersection(vals):
+            self.env['res.company']._l10n_gt_edi_clear_static_cache()
+        return res
@@ -1,17 +1,76 @@
 import logging
-import requests
-from datetime import datetime, timezone
-from json import JSONDecodeError
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime, time, timezone
 from zoneinfo import ZoneInfo
 
 from lxml import etree
 
 from odoo import models, fields, api, _
-from odoo.tools import cleanup_xml_node
+from odoo.tools import SQL, cleanup_xml_node, split_every
+from odoo.tools.sql import create_index
 from odoo.exceptions import UserError
 
+from .utils import (
+    _l10n_gt_edi_infile_cancel,
+    _l10n_gt_edi_infile_certify,
+    _l10n_gt_edi_run_in_pool,
+    _l10n_gt_edi_serialize_compact,
+    _l10n_gt_edi_timer,
+)
+
 DTE_NS = "{http://www.sat.gob.gt/dte/fel/0.2.0}"
 DTE_NS_URL = "http://www.sat.gob.gt/dte/fel/0.2.0"
+CEX_NS_URL = "http://www.sat.gob.gt/face2/ComplementoExportaciones/0.1.0"
+CEX_NS = "{%s}" % CEX_NS_URL
+
+# XPath precompilados (una sola vez por proceso) para las etapas de transformación del XML
+XPATH_RECEPTOR = etree.XPath('//dte:Receptor', namespaces={'dte': DTE_NS_URL})
+XPATH_SAT = etree.XPath('//dte:SAT', namespaces={'dte': DTE_NS_URL})
+XPATH_EXPORTACION = etree.XPath('//cex:Exportacion', namespaces={'cex': CEX_NS_URL})
+
+# Número de hilos por defecto para enviar lotes de facturas a Infile
+DEFAULT_BATCH_MAX_WORKERS = 4
+
+# Reclamo de facturas para certificar: pasado este tiempo un reclamo se considera
+# abandonado (worker caído) y la factura se puede volver a reclamar
+CLAIM_STALE_MINUTES = 30
+
+# Certificación del backlog de facturas pendientes: valores por defecto
+SWEEPER_CHUNK_SIZE = 100
+SWEEPER_MAX_CHUNKS = 10
+
+# Política de confirmación (commit) por defecto en certificación masiva
+DEFAULT_COMMIT_EVERY = 50
+
+# Sincronización retroactiva de campos FEL: tamaño de bloque y punto de control
+FEL_SYNC_CHUNK_SIZE = 1000
+FEL_SYNC_CHECKPOINT_PARAM = 'l10n_gt_edi.sync_fel_fields.last_move_id'
+
+# Migración de campos FEL legacy a l10n_gt_edi.document: punto de control
+FEL_LEGACY_MIGRATION_CHECKPOINT_PARAM = 'l10n_gt_edi.migrate_legacy_fel.last_move_id'
+
+# Columnas de serie/número de la factura (mrdc_shipment_base y legacy fel_gt/sam_gt),
+# en orden de prioridad para la búsqueda inversa
+FEL_NUMBER_COLUMNS = [
+    ('invoice_series', 'invoice_number'),
+    ('x_studio_serie', 'x_studio_nmero_de_dte'),
+    ('serie_fel', 'numero_fel'),
+]
+# Columnas legacy con el UUID FEL
+FEL_LEGACY_UUID_COLUMNS = ['firma_fel', 'uuid_fel']
+# Columnas legacy (fel_gt/fel_infile/sam_gt) con los datos FEL de un documento origen,
+# en orden de prioridad. Las dos primeras de UUID y número determinan si la factura
+# fue certificada con el módulo legacy; las demás solo se usan como respaldo.
+FEL_LEGACY_ORIGIN_COLUMNS = {
+    'uuid': ['firma_fel', 'uuid_fel', 'uuid'],
+    'serial_number': ['x_studio_nmero_de_dte', 'numero_fel', 'invoice_number'],
+    'series': ['x_studio_serie', 'serie_fel', 'invoice_series'],
+}
+FEL_LEGACY_CERTIFIED_DEPTH = 2
+
+# Empresas que llevan Adenda personalizada (Complemento03)
+EMPRESAS_ADENDA = [6, 15, 16, 18]
 
 # URL base de Infile para ver reportes
 INFILE_REPORT_URL = "https://report.feel.com.gt/ingfacereport/ingfacereport_documento"
@@ -27,6 +86,7 @@ class AccountMove(models.Model):
         string="UUID FEL",
         compute="_compute_l10n_gt_edi_uuid",
         store=True,
+        index='btree_not_null',
         help="UUID del documento FEL (incluye anulados)",
     )
     l10n_gt_edi_show_infile_button = fields.Boolean(
@@ -34,8 +94,26 @@ class AccountMove(models.Model):
         compute="_compute_l10n_gt_edi_uuid",
         store=True,
     )
+    l10n_gt_edi_claimed_at = fields.Datetime(
+        string="Reclamada para Certificación",
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+        help="Momento en que un proceso tomó la factura para certificarla "
+             "(ver _l10n_gt_edi_claim_for_certification).",
+    )
+    l10n_gt_edi_current_document_id = fields.Many2one(
+        'l10n_gt_edi.document',
+        string="Documento FEL Vigente",
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+        ondelete='set null',
+        help="Último documento FEL certificado (enviado o anulado) de la factura. "
+             "Se mantiene desde l10n_gt_edi.document al crear, modificar o eliminar documentos.",
+    )
 
-    @api.depends('l10n_gt_edi_document_ids', 'l10n_gt_edi_document_ids.state', 'l10n_gt_edi_document_ids.uuid')
+    @api.depends('l10n_gt_edi_current_document_id', 'l10n_gt_edi_current_document_id.uuid')
     def _compute_l10n_gt_edi_uuid(self):
         """
         Computa el UUID del documento FEL para mostrar el botón de Infile.
@@ -43,12 +121,119 @@ class AccountMove(models.Model):
         siempre esté visible si hay un UUID.
         """
         for move in self:
-            # Buscar documento FEL con UUID (enviado o anulado)
-            fel_doc = move.l10n_gt_edi_document_ids.filtered(
-                lambda d: d.uuid and d.state in ('invoice_sent', 'invoice_cancelled')
-            ).sorted('id', reverse=True)[:1]
-            move.l10n_gt_edi_uuid = fel_doc.uuid if fel_doc else ''
-            move.l10n_gt_edi_show_infile_button = bool(fel_doc.uuid) if fel_doc else False
+            # Documento FEL vigente (enviado o anulado)
+            fel_doc = move.l10n_gt_edi_current_document_id
+            move.l10n_gt_edi_uuid = fel_doc.uuid or ''
+            move.l10n_gt_edi_show_infile_button = bool(fel_doc.uuid)
+
+    l10n_gt_edi_origin_fel_data = fields.Json(
+        string="Datos FEL como Documento Origen",
+        compute="_compute_l10n_gt_edi_origin_fel_data",
+        help="UUID, serie, número y fecha FEL de la factura (documento nativo o campos legacy), "
+             "usados al referenciarla desde una NC/ND.",
+    )
+
+    @api.depends(lambda self: [
+        'l10n_gt_edi_current_document_id', 'l10n_gt_edi_current_document_id.state',
+        'invoice_date', 'l10n_gt_edi_state',
+        *(fname for columns in FEL_LEGACY_ORIGIN_COLUMNS.values() for fname in columns if fname in self._fields),
+    ])
+    def _compute_l10n_gt_edi_origin_fel_data(self):
+        # Campo no almacenado: se calcula para todo el lote de prefetch, de modo que
+        # nc.reversed_entry_id.l10n_gt_edi_origin_fel_data resuelve todos los orígenes a la vez
+        origin_data = self._l10n_gt_edi_resolve_origin_fel_data()
+        for move in self:
+            move.l10n_gt_edi_origin_fel_data = origin_data.get(move.id) or {}
+
+    def _l10n_gt_edi_resolve_origin_fel_data(self):
+        """
+        Resuelve los datos FEL de un lote de facturas origen en pocas consultas:
+        los documentos nativos vía l10n_gt_edi_current_document_id y las columnas
+        legacy disponibles con una sola lectura para el resto.
+
+        Returns:
+            dict: {move_id: {'uuid', 'series', 'serial_number', 'date', 'source', 'certified'}}
+                  'date' es la fecha de emisión (YYYY-MM-DD, hora de Guatemala) y 'source'
+                  es 'document' o 'legacy'.
+        """
+        moves = self.filtered('id')
+        result = {}
+        legacy_move_ids = []
+        for move in moves:
+            fel_doc = move.l10n_gt_edi_current_document_id
+            if fel_doc.state == 'invoice_sent':
+                emission_date = fel_doc.datetime
+                result[move.id] = {
+                    'uuid': fel_doc.uuid or '',
+                    'series': fel_doc.series or '',
+                    'serial_number': fel_doc.serial_number or '',
+                    'date': emission_date.astimezone(ZoneInfo("America/Guatemala")).strftime("%Y-%m-%d")
+                            if emission_date else '',
+                    'source': 'document',
+                    'certified': True,
+                }
+            else:
+                legacy_move_ids.append(move.id)
+        if not legacy_move_ids:
+            return result
+        legacy_moves = self.browse(legacy_move_ids)
+
+        # Una sola lectura de todas las columnas legacy que existan en esta base
+        fnames = [
+            fname
+            for columns in FEL_LEGACY_ORIGIN_COLUMNS.values()
+            for fname in columns
+            if fname in self._fields
+        ]
+        for row in legacy_moves.read(fnames + ['invoice_date', 'l10n_gt_edi_state'], load=False):
+            data = {
+                'date': row['invoice_date'].strftime("%Y-%m-%d") if row['invoice_date'] else '',
+                'source': 'legacy',
+            }
+            strict = {}
+            for key, columns in FEL_LEGACY_ORIGIN_COLUMNS.items():
+                data[key] = ''
+                strict[key] = False
+                for depth, fname in enumerate(columns):
+                    if row.get(fname):
+                        data[key] = str(row[fname])
+                        strict[key] = depth < FEL_LEGACY_CERTIFIED_DEPTH
+                        break
+            data['certified'] = row['l10n_gt_edi_state'] == 'invoice_sent' or (
+                strict['uuid'] and strict['serial_number']
+            )
+            result[row['id']] = data
+        return result
+
+    def _l10n_gt_edi_get_sent_document(self):
+        """Documento FEL enviado (no anulado) de la factura, o un recordset vacío."""
+        self.ensure_one()
+        fel_doc = self.l10n_gt_edi_current_document_id
+        return fel_doc if fel_doc.state == 'invoice_sent' else fel_doc.browse()
+
+    def _l10n_gt_edi_refresh_current_document(self):
+        """
+        Recalcula l10n_gt_edi_current_document_id con una sola consulta
+        (usa el índice (invoice_id, state, id) de l10n_gt_edi_document).
+        """
+        if not self:
+            return
+        self.env['l10n_gt_edi.document'].flush_model(['invoice_id', 'state'])
+        self.env.cr.execute("""
+            SELECT move.id,
+                   (SELECT doc.id
+                      FROM l10n_gt_edi_document doc
+                     WHERE doc.invoice_id = move.id
+                       AND doc.state IN ('invoice_sent', 'invoice_cancelled')
+                  ORDER BY doc.id DESC
+                     LIMIT 1)
+              FROM account_move move
+             WHERE move.id = ANY(%s)
+        """, [self.ids])
+        for move_id, document_id in self.env.cr.fetchall():
+            move = self.browse(move_id)
+            if move.l10n_gt_edi_current_document_id.id != document_id:
+                move.l10n_gt_edi_current_document_id = document_id
 
     def action_open_infile_report(self):
         """
@@ -65,6 +250,143 @@ class AccountMove(models.Model):
             'target': 'new',
         }
 
+    # =========================================================================
+    # BÚSQUEDA INVERSA POR UUID FEL Y SERIE/NÚMERO
+    # =========================================================================
+
+    def init(self):
+        super().init()
+        # Índices sobre columnas que vienen de otros módulos (o de Studio):
+        # solo se crean si la columna existe en esta base
+        # Indexan la misma expresión de texto con la que se busca (ver _l10n_gt_edi_text_column)
+        for series_column, number_column in FEL_NUMBER_COLUMNS:
+            if self._l10n_gt_edi_is_stored_column(series_column) and self._l10n_gt_edi_is_stored_column(number_column):
+                expressions = [self._l10n_gt_edi_text_column(series_column), self._l10n_gt_edi_text_column(number_column)]
+                suffix = '' if expressions == [f'"{series_column}"', f'"{number_column}"'] else '_varchar'
+                create_index(
+                    self.env.cr,
+                    f'account_move__{series_column}_{number_column}{suffix}_index',
+                    self._table,
+                    [f'({expression})' for expression in expressions],
+                    where=f'{number_column} IS NOT NULL',
+                )
+        for uuid_column in FEL_LEGACY_UUID_COLUMNS:
+            if self._l10n_gt_edi_is_stored_column(uuid_column):
+                expression = self._l10n_gt_edi_text_column(uuid_column)
+                suffix = '' if expression == f'"{uuid_column}"' else '_varchar'
+                create_index(
+                    self.env.cr,
+                    f'account_move__{uuid_column}{suffix}_index',
+                    self._table,
+                    [f'({expression})'],
+                    where=f'{uuid_column} IS NOT NULL',
+                )
+
+    @api.model
+    def _l10n_gt_edi_is_stored_column(self, fname):
+        field = self._fields.get(fname)
+        return bool(field and field.store and field.column_type)
+
+    @api.model
+    def _l10n_gt_edi_text_column(self, fname, alias=None):
+        """
+        Expresión SQL de la columna como texto: las columnas legacy/Studio pueden ser
+        enteras. Las de texto se usan tal cual; las demás con ::varchar, que es la
+        expresión que indexa init() para que el índice siga sirviendo.
+        """
+        column = f'{alias}."{fname}"' if alias else f'"{fname}"'
+        if self._fields[fname].column_type[0] in ('varchar', 'text'):
+            return column
+        return f'{column}::varchar'
+
+    @api.model
+    def _l10n_gt_edi_search_by_fel_uuids(self, uuids):
+        """
+        Resuelve un lote de UUID FEL (de certificación o de anulación) a facturas
+        con una sola consulta. Incluye los UUID legacy (firma_fel, uuid_fel)
+        de facturas certificadas antes de l10n_gt_edi.
+
+        Returns:
+            dict: {uuid: account.move} solo para los UUID encontrados.
+        """
+        uuids = list({uuid.strip() for uuid in uuids if uuid and uuid.strip()})
+        if not uuids:
+            return {}
+
+        self.flush_model(['l10n_gt_edi_uuid'])
+        self.env['l10n_gt_edi.document'].flush_model(['invoice_id', 'cancellation_uuid'])
+        # Orden de prioridad (columna priority): documento nativo, UUID de anulación, campos legacy
+        queries = [
+            SQL("SELECT id, l10n_gt_edi_uuid, 0 AS priority FROM account_move WHERE l10n_gt_edi_uuid = ANY(%s)", uuids),
+            SQL("SELECT invoice_id, cancellation_uuid, 1 FROM l10n_gt_edi_document WHERE cancellation_uuid = ANY(%s)", uuids),
+        ]
+        for priority, uuid_column in enumerate(FEL_LEGACY_UUID_COLUMNS, start=2):
+            if self._l10n_gt_edi_is_stored_column(uuid_column):
+                self.flush_model([uuid_column])
+                # Las columnas legacy/Studio pueden no ser de texto
+                queries.append(SQL(
+                    "SELECT id, %(column)s, %(priority)s FROM account_move WHERE %(column)s = ANY(%(uuids)s)",
+                    column=SQL(self._l10n_gt_edi_text_column(uuid_column)),
+                    priority=priority,
+                    uuids=uuids,
+                ))
+        self.env.cr.execute(SQL("%s ORDER BY priority", SQL(" UNION ALL ").join(queries)))
+
+        result = {}
+        for move_id, uuid, _priority in self.env.cr.fetchall():
+            result.setdefault(uuid, move_id)
+        return {uuid: self.browse(move_id) for uuid, move_id in result.items()}
+
+    @api.model
+    def _l10n_gt_edi_search_by_fel_numbers(self, series_numbers):
+        """
+        Resuelve un lote de pares (serie, número) FEL a facturas con una sola consulta.
+        Busca en los documentos FEL nativos, en invoice_series/invoice_number y en
+        las columnas legacy que existan.
+
+        Returns:
+            dict: {(serie, número): account.move} solo para los pares encontrados.
+        """
+        pairs = list({(str(series).strip(), str(number).strip()) for series, number in series_numbers if series and number})
+        if not pairs:
+            return {}
+
+        wanted = SQL(
+            "SELECT unnest(%s::varchar[]) AS series, unnest(%s::varchar[]) AS number",
+            [series for series, _number in pairs],
+            [number for _series, number in pairs],
+        )
+        self.env['l10n_gt_edi.document'].flush_model(['invoice_id', 'state', 'series', 'serial_number'])
+        # Orden de prioridad (columna priority): documento nativo y luego FEL_NUMBER_COLUMNS en orden
+        queries = [SQL("""
+            SELECT doc.invoice_id, doc.series, doc.serial_number, 0 AS priority
+              FROM l10n_gt_edi_document doc
+              JOIN (%s) wanted ON wanted.series = doc.series AND wanted.number = doc.serial_number
+             WHERE doc.state IN ('invoice_sent', 'invoice_cancelled')
+        """, wanted)]
+        for priority, (series_column, number_column) in enumerate(FEL_NUMBER_COLUMNS, start=1):
+            if self._l10n_gt_edi_is_stored_column(series_column) and self._l10n_gt_edi_is_stored_column(number_column):
+                self.flush_model([series_column, number_column])
+                # Las columnas legacy/Studio pueden ser enteras: se comparan y devuelven como texto
+                queries.append(SQL(
+                    """
+                    SELECT move.id, %(series)s, %(number)s, %(priority)s
+                      FROM account_move move
+                      JOIN (%(wanted)s) wanted ON wanted.series = %(series)s
+                                              AND wanted.number = %(number)s
+                    """,
+                    series=SQL(self._l10n_gt_edi_text_column(series_column, 'move')),
+                    number=SQL(self._l10n_gt_edi_text_column(number_column, 'move')),
+                    priority=priority,
+                    wanted=wanted,
+                ))
+        self.env.cr.execute(SQL("%s ORDER BY priority", SQL(" UNION ALL ").join(queries)))
+
+        result = {}
+        for move_id, series, number, _priority in self.env.cr.fetchall():
+            result.setdefault((series, number), move_id)
+        return {pair: self.browse(move_id) for pair, move_id in result.items()}
+
     # =========================================================================
     # VERIFICACIÓN DE CERTIFICACIÓN FEL (módulo nuevo y legacy)
     # =========================================================================
@@ -78,21 +400,8 @@ class AccountMove(models.Model):
             bool: True si la factura fue certificada en FEL
         """
         self.ensure_one()
-
-        # Verificar módulo nuevo (l10n_gt_edi)
-        if self.l10n_gt_edi_state == 'invoice_sent':
-            return True
-
-        # Verificar campos legacy (fel_gt/fel_infile)
-        uuid = getattr(self, 'firma_fel', '') or getattr(self, 'uuid_fel', '') or ''
-        serial_number = getattr(self, 'x_studio_nmero_de_dte', '') or getattr(self, 'numero_fel', '') or ''
-        series = getattr(self, 'x_studio_serie', '') or getattr(self, 'serie_fel', '') or ''
-
-        # Si tiene UUID y número, consideramos que fue certificada
-        if uuid and serial_number:
-            return True
-
-        return False
+        # Módulo nuevo (l10n_gt_edi) o campos legacy (fel_gt/fel_infile) con UUID y número
+        return bool(self.l10n_gt_edi_origin_fel_data.get('certified'))
 
     def _l10n_gt_edi_get_alerts(self):
         """
@@ -127,6 +436,41 @@ class AccountMove(models.Model):
     # CERTIFICACIÓN AL CONFIRMAR (en lugar de al enviar)
     # =========================================================================
 
+    l10n_gt_edi_pending_certification = fields.Boolean(
+        string="Pendiente de Certificar FEL",
+        compute='_compute_l10n_gt_edi_pending_certification',
+        store=True,
+        copy=False,
+        help="Factura publicada a la que aplica FEL y que aún no se ha enviado a INFILE.",
+    )
+
+    # Backlog de facturas pendientes (ver _cron_l10n_gt_edi_certify_pending)
+    _l10n_gt_edi_pending_certification_idx = models.Index(
+        "(company_id, id) WHERE l10n_gt_edi_pending_certification"
+    )
+
+    def _l10n_gt_edi_get_legacy_uuid_fields(self):
+        """Columnas legacy con UUID certificado (fel_gt/fel_infile) que existen en esta base."""
+        return [
+            fname
+            for fname in FEL_LEGACY_ORIGIN_COLUMNS['uuid'][:FEL_LEGACY_CERTIFIED_DEPTH]
+            if fname in self._fields
+        ]
+
+    @api.depends(lambda self: [
+        'state', 'country_code', 'l10n_gt_edi_state', 'l10n_gt_edi_doc_type', 'move_type',
+        *self._l10n_gt_edi_get_legacy_uuid_fields(),
+    ])
+    def _compute_l10n_gt_edi_pending_certification(self):
+        legacy_fnames = self._l10n_gt_edi_get_legacy_uuid_fields()
+        for move in self:
+            # Las certificadas con el módulo legacy ya tienen DTE en SAT: no se vuelven a enviar
+            move.l10n_gt_edi_pending_certification = (
+                move.state == 'posted'
+                and move._l10n_gt_edi_is_fel_applicable()
+                and not any(move[fname] for fname in legacy_fnames)
+            )
+
     def _l10n_gt_edi_is_fel_applicable(self):
         """Verifica si la factura aplica para certificación FEL"""
         self.ensure_one()
@@ -185,16 +529,32 @@ class AccountMove(models.Model):
         result = super(AccountMove, self).action_post()
 
         # Luego certificar en FEL las que tienen auto-certificación activa
-        for move in self.filtered(lambda m: m._l10n_gt_edi_should_auto_certify() or (
+        to_send = self.filtered(lambda m: m._l10n_gt_edi_should_auto_certify() or (
             m.country_code == 'GT' and not m.l10n_gt_edi_state and m.l10n_gt_edi_doc_type
             and m.journal_id and m.journal_id.l10n_gt_edi_auto_certify
-        )):
-            # Re-verificar después del post
-            if move.state == 'posted' and not move.l10n_gt_edi_state:
-                move._l10n_gt_edi_try_send()
+        ))
+        # Re-verificar después del post
+        to_send = to_send.filtered(lambda m: m.state == 'posted' and not m.l10n_gt_edi_state)
+        to_send._l10n_gt_edi_certify()
 
         return result
 
+    def _l10n_gt_edi_certify(self):
+        """
+        Certifica las facturas ya publicadas.
+        Las de diarios con 'Certificar FEL en Segundo Plano' se encolan;
+        el resto se envían a INFILE en este momento.
+        """
+        to_queue = self.filtered(lambda m: m.journal_id.l10n_gt_edi_certify_async)
+        if to_queue:
+            self.env['l10n_gt_edi.certification.job']._enqueue(to_queue)
+
+        to_send = self - to_queue
+        if len(to_send) == 1:
+            to_send._l10n_gt_edi_try_send()
+        elif to_send:
+            to_send._l10n_gt_edi_try_send_batch()
+
     def action_post_without_fel(self):
         """
         Confirma la factura sin certificar en FEL.
@@ -222,35 +582,12 @@ class AccountMove(models.Model):
     )
     is_export_invoice = fields.Boolean(
         string="Es Factura de Exportación",
-        compute="_compute_is_export_invoice",
+        related='fiscal_position_id.l10n_gt_edi_is_export',
         store=True,
-        help="Indica si es una factura de exportación basado en la posición fiscal.",
+        help="Indica si es una factura de exportación según la posición fiscal "
+             "(campo Exportación FEL de la posición fiscal).",
     )
 
-    @api.depends('fiscal_position_id', 'country_code')
-    def _compute_is_export_invoice(self):
-        """
-        Determina si es factura de exportación basándose en la posición fiscal.
-        Busca posiciones fiscales que NO tengan país asignado (exportación/cliente extranjero).
-        """
-        for move in self:
-            # Es exportación si:
-            # 1. País de la compañía es GT
-            # 2. La posición fiscal NO tiene país asignado (Foreign/Extranjero)
-            #    O el nombre contiene "Foreign" o "Extranjero"
-            is_foreign_fp = False
-            if move.fiscal_position_id:
-                fp = move.fiscal_position_id
-                # Posiciones fiscales de exportación típicamente no tienen país
-                # o tienen nombre que indica cliente extranjero
-                is_foreign_fp = (
-                    not fp.country_id or
-                    'foreign' in (fp.name or '').lower() or
-                    'extranjero' in (fp.name or '').lower() or
-                    'exporta' in (fp.name or '').lower()
-                )
-            move.is_export_invoice = move.country_code == 'GT' and is_foreign_fp
-
     @api.depends('l10n_gt_edi_show_consignatory_partner', 'commercial_partner_id')
     def _compute_l10n_gt_edi_consignatory_partner(self):
         """
@@ -274,29 +611,58 @@ class AccountMove(models.Model):
         1. Si el journal tiene frases y está activo 'Usar Frases del Diario' → usar solo frases del journal
         2. Si no → usar frases de compañía + partner (comportamiento original)
         """
+        Phrase = self.env['l10n_gt_edi.phrase']
+        # Las frases se resuelven una vez por (diario, compañía, cliente)
+        resolved = {}
+        # Asignación agrupada: ids de frases -> (frases, ids de facturas); ids en listas
+        # para no unir recordsets dentro del bucle (cuadrático en lotes grandes)
+        assignments = {}
+        journal_move_ids = []
         for move in self:
             if move.country_code == 'GT' and move.commercial_partner_id:
-                # Verificar si el journal tiene frases configuradas y está activo
-                journal = move.journal_id
-                if (journal and
-                    journal.l10n_gt_edi_use_journal_phrases and
-                    journal.l10n_gt_edi_phrase_ids):
-                    # Usar SOLO las frases del journal (prioridad máxima)
-                    move.l10n_gt_edi_phrase_ids = journal.l10n_gt_edi_phrase_ids
-                    logging.info("FEL Frases: Usando frases del diario %s para factura %s",
-                                journal.name, move.name)
-                else:
-                    # Comportamiento original: compañía + partner
-                    if move.state == 'draft':
-                        move.l10n_gt_edi_phrase_ids = (
-                            move.l10n_gt_edi_phrase_ids +
-                            move.company_id.l10n_gt_edi_phrase_ids +
-                            move.commercial_partner_id.l10n_gt_edi_phrase_ids
-                        )
+                key = (move.journal_id.id, move.company_id.id, move.commercial_partner_id.id)
+                if key not in resolved:
+                    static_data = self.env['res.company']._l10n_gt_edi_get_static_fel_data(
+                        move.company_id.id, move.journal_id.id,
+                    )
+                    if move.journal_id and static_data['journal_phrase_ids']:
+                        # Usar SOLO las frases del journal (prioridad máxima)
+                        resolved[key] = (True, Phrase.browse(static_data['journal_phrase_ids']))
                     else:
-                        move.l10n_gt_edi_phrase_ids = move.l10n_gt_edi_phrase_ids
+                        # Comportamiento original: compañía + partner
+                        resolved[key] = (False, (
+                            Phrase.browse(static_data['company_phrase_ids']) |
+                            move.commercial_partner_id.l10n_gt_edi_phrase_ids
+                        ))
+                from_journal, phrases = resolved[key]
+                if from_journal:
+                    journal_move_ids.append(move.id)
+                elif move.state == 'draft':
+                    phrases = move.l10n_gt_edi_phrase_ids | phrases
+                else:
+                    phrases = move.l10n_gt_edi_phrase_ids
             else:
-                move.l10n_gt_edi_phrase_ids = False
+                phrases = Phrase
+            assignments.setdefault(tuple(phrases.ids), (phrases, []))[1].append(move.id)
+
+        for phrases, move_ids in assignments.values():
+            self.browse(move_ids).l10n_gt_edi_phrase_ids = phrases
+
+        if journal_move_ids:
+            journal_moves = self.browse(journal_move_ids)
+            logging.info(
+                "FEL Frases: %s de %s facturas usan frases del diario (%s diarios)",
+                len(journal_moves), len(self), len(journal_moves.journal_id),
+            )
+
+    def _l10n_gt_edi_get_static_fel_data(self):
+        """
+        Datos FEL de la compañía y diario de la factura, desde la caché por
+        (compañía, diario) de res.company. Devuelve una copia que se puede modificar.
+        """
+        self.ensure_one()
+        data = self.env['res.company']._l10n_gt_edi_get_static_fel_data(self.company_id.id, self.journal_id.id)
+        return {**data, 'credentials': dict(data['credentials'])}
 
     def _l10n_gt_edi_get_adenda_complemento03(self):
         """
@@ -332,27 +698,24 @@ class AccountMove(models.Model):
 
         return ' '.join(partes)
 
-    def _l10n_gt_edi_modify_receptor(self, xml_string):
+    def _l10n_gt_edi_modify_receptor(self, root):
         """
-        Modifica la sección Receptor del XML para agregar:
+        Modifica (en sitio) la sección Receptor del XML para agregar:
         - CorreoReceptor como atributo
         - DireccionReceptor con sus subelementos (Direccion, CodigoPostal, Municipio, Departamento, Pais)
         """
         self.ensure_one()
         partner = self.commercial_partner_id
+        nsmap = {'dte': DTE_NS_URL}
 
         logging.info("=== RECEPTOR: Iniciando _l10n_gt_edi_modify_receptor ===")
         logging.info("RECEPTOR: Partner: %s", partner.name)
 
-        # Parsear el XML
-        root = etree.fromstring(xml_string.encode('utf-8'))
-        nsmap = {'dte': DTE_NS_URL}
-
         # Buscar el elemento Receptor
-        receptor = root.find('.//dte:Receptor', nsmap)
+        receptor = next(iter(XPATH_RECEPTOR(root)), None)
         if receptor is None:
             logging.warning("RECEPTOR: No se encontró elemento Receptor en el XML")
-            return xml_string
+            return
 
         logging.info("RECEPTOR: Elemento Receptor encontrado")
 
@@ -401,14 +764,11 @@ class AccountMove(models.Model):
         else:
             logging.info("RECEPTOR: DireccionReceptor ya existe - no se modifica")
 
-        result_xml = etree.tostring(root, pretty_print=True, encoding='unicode')
         logging.info("=== RECEPTOR: XML modificado exitosamente ===")
 
-        return result_xml
-
-    def _l10n_gt_edi_modify_adenda(self, xml_string):
+    def _l10n_gt_edi_modify_adenda(self, root):
         """
-        Modifica la sección Adenda del XML generado.
+        Modifica (en sitio) la sección Adenda del XML generado.
         Reemplaza el contenido de Adenda con Complemento03.
         Solo aplica para empresas con ID: 6, 15, 16, 18
         """
@@ -419,26 +779,23 @@ class AccountMove(models.Model):
                      self.name, self.company_id.id, self.company_id.name)
 
         # Solo aplicar para estas empresas
-        EMPRESAS_ADENDA = [6, 15, 16, 18]
         if self.company_id.id not in EMPRESAS_ADENDA:
             logging.info("ADENDA: Company ID %s NO está en lista %s - SALTANDO",
                          self.company_id.id, EMPRESAS_ADENDA)
-            return xml_string
+            return
 
         logging.info("ADENDA: Company ID %s SÍ está en lista - PROCESANDO", self.company_id.id)
 
         complemento03 = self._l10n_gt_edi_get_adenda_complemento03()
         logging.info("ADENDA: Complemento03 generado: '%s'", complemento03)
 
-        # Parsear el XML
-        root = etree.fromstring(xml_string.encode('utf-8'))
-        nsmap = {'dte': 'http://www.sat.gob.gt/dte/fel/0.2.0'}
+        nsmap = {'dte': DTE_NS_URL}
 
         # Buscar el elemento SAT
-        sat_element = root.find('.//dte:SAT', nsmap)
+        sat_element = next(iter(XPATH_SAT(root)), None)
         if sat_element is None:
             logging.warning("ADENDA: No se encontró elemento SAT en el XML")
-            return xml_string
+            return
 
         logging.info("ADENDA: Elemento SAT encontrado")
 
@@ -453,18 +810,14 @@ class AccountMove(models.Model):
         else:
             logging.info("ADENDA: No existe Adenda - creando nueva")
             # Crear nueva Adenda (con namespace dte:)
-            adenda = etree.SubElement(sat_element, '{http://www.sat.gob.gt/dte/fel/0.2.0}Adenda')
+            adenda = etree.SubElement(sat_element, DTE_NS + 'Adenda')
 
         # Agregar Complemento03 SIN namespace (así lo espera el SAT)
         complemento_elem = etree.SubElement(adenda, 'Complemento03')
         complemento_elem.text = complemento03 or ''
         logging.info("ADENDA: Complemento03 agregado a Adenda")
-
-        result_xml = etree.tostring(root, pretty_print=True, encoding='unicode')
         logging.info("=== ADENDA: XML modificado exitosamente ===")
 
-        return result_xml
-
     def _l10n_gt_edi_add_reference_values(self, gt_values: dict):
         """
         Sobrescribe para buscar datos de referencia también en campos legacy.
@@ -483,36 +836,15 @@ class AccountMove(models.Model):
         if not reference_move:
             raise UserError(_("No se encontró el documento de referencia para la NC/ND."))
 
-        # Intentar obtener datos del documento FEL nativo
-        original_document = reference_move.l10n_gt_edi_document_ids.filtered(
-            lambda d: d.state == 'invoice_sent'
-        ).sorted('id', reverse=True)[:1]
-
-        if original_document:
-            # Usar datos del documento FEL nativo
-            uuid = original_document.uuid
-            serial_number = original_document.serial_number
-            series = original_document.series
-            fecha_emision = original_document.datetime
-            logging.info("NC/ND: Usando datos de l10n_gt_edi_document - UUID: %s, Serie: %s, Número: %s",
-                        uuid, series, serial_number)
-        else:
-            # Buscar en campos legacy (fel_gt/fel_infile)
-            uuid = getattr(reference_move, 'firma_fel', '') or ''
-            serial_number = getattr(reference_move, 'x_studio_nmero_de_dte', '') or ''
-            series = getattr(reference_move, 'x_studio_serie', '') or ''
-            fecha_emision = reference_move.invoice_date
-
-            # Si sigue sin encontrar, intentar con otros nombres de campos
-            if not uuid:
-                uuid = getattr(reference_move, 'uuid_fel', '') or getattr(reference_move, 'uuid', '') or ''
-            if not serial_number:
-                serial_number = getattr(reference_move, 'numero_fel', '') or getattr(reference_move, 'invoice_number', '') or ''
-            if not series:
-                series = getattr(reference_move, 'serie_fel', '') or getattr(reference_move, 'invoice_series', '') or ''
-
-            logging.info("NC/ND: Usando datos legacy - UUID: %s, Serie: %s, Número: %s",
-                        uuid, series, serial_number)
+        # Documento FEL nativo o, si no existe, campos legacy (fel_gt/fel_infile)
+        origin_data = reference_move.l10n_gt_edi_origin_fel_data
+        uuid = origin_data.get('uuid')
+        serial_number = origin_data.get('serial_number')
+        series = origin_data.get('series')
+        fecha_str = origin_data.get('date') or ''
+        logging.info("NC/ND: Usando datos de %s - UUID: %s, Serie: %s, Número: %s",
+                    'l10n_gt_edi_document' if origin_data.get('source') == 'document' else 'campos legacy',
+                    uuid, series, serial_number)
 
         # Validar que tenemos los datos necesarios
         if not uuid or not serial_number or not series:
@@ -525,12 +857,6 @@ class AccountMove(models.Model):
                 "Por favor verifique que la factura original tenga los campos FEL correctamente llenados."
             ) % (uuid or 'NO ENCONTRADO', series or 'NO ENCONTRADO', serial_number or 'NO ENCONTRADO'))
 
-        # Formatear fecha
-        if hasattr(fecha_emision, 'astimezone'):
-            fecha_str = fecha_emision.astimezone(ZoneInfo("America/Guatemala")).strftime("%Y-%m-%d")
-        else:
-            fecha_str = fecha_emision.strftime("%Y-%m-%d") if fecha_emision else ''
-
         gt_values.update({
             'referencias_motivo_ajuste': self.ref,
             'referencias_fecha_emision_documento_origen': fecha_str,
@@ -546,72 +872,560 @@ class AccountMove(models.Model):
         """
         Sobrescribe el método de envío para modificar la Adenda antes de enviar.
         """
-        from odoo.addons.l10n_gt_edi.models.utils import _l10n_gt_edi_send_to_sat
-        from odoo import _
-
         logging.info("=== ADENDA: MÉTODO _l10n_gt_edi_try_send SOBRESCRITO EJECUTÁNDOSE ===")
         logging.info("ADENDA: Factura: %s, ID: %s", self.name, self.id)
 
         self.ensure_one()
-        self.env['res.company']._with_locked_records(self)
+        # Sin filtrar por tipo ni estado (como el método original): solo falla si otro proceso la tiene
+        if not self._l10n_gt_edi_claim_for_certification(move_ids=self.ids, certifiable_only=False):
+            raise UserError(_("La factura %s ya está siendo certificada por otro proceso.", self.name))
+        # Otro proceso pudo certificarla o anularla antes de este reclamo
+        self.invalidate_recordset(['l10n_gt_edi_document_ids', 'l10n_gt_edi_current_document_id'])
+        if self.l10n_gt_edi_current_document_id:
+            self._l10n_gt_edi_release_claim()
+            raise UserError(_("La factura %s ya tiene un documento FEL certificado.", self.name))
+
+        # Una sola factura: todas las políticas confirman al terminar, salvo 'none'
+        policy, _every = self._l10n_gt_edi_get_commit_policy()
+
+        # Un envío anterior sin respuesta pudo haberse certificado: consultar antes de reenviar
+        if self._l10n_gt_edi_recover_in_flight():
+            self._l10n_gt_edi_release_claim()
+            if policy != 'none':
+                self._cr.commit()
+            return
+
+        timings = {}
+        payload = self._l10n_gt_edi_prepare_send(timings)
+        if not payload:
+            self.env['l10n_gt_edi.send.metric']._record(self._l10n_gt_edi_get_send_metric_vals(timings, False))
+            self._l10n_gt_edi_release_claim()
+            return
+
+        # Send the XML to Infile
+        with _l10n_gt_edi_timer(timings, 'http'):
+            result = self.env['l10n_gt_edi.rate.bucket']._run_rate_limited(
+                [payload], lambda payloads: [self._l10n_gt_edi_send_payload(p) for p in payloads],
+            )[0]
+
+        success = self._l10n_gt_edi_process_send_result_in_savepoint(payload, result)
+        self.env['l10n_gt_edi.send.metric']._record(self._l10n_gt_edi_get_send_metric_vals(timings, success))
+        self._l10n_gt_edi_release_claim()
+        if success and policy != 'none':
+            self._cr.commit()
+
+    def _l10n_gt_edi_try_send_batch(self):
+        """
+        Certifica varias facturas a la vez.
+
+        1. Construye el XML de todas las facturas en el cursor principal.
+        2. Envía las peticiones a Infile en un pool de hilos acotado
+           (parámetro de sistema l10n_gt_edi.batch_max_workers).
+        3. Aplica los resultados (documentos, campos FEL, mensajes) en el hilo principal,
+           cada factura en su savepoint, confirmando según la política de la compañía
+           (ver _l10n_gt_edi_get_commit_policy).
+        """
+        if not self:
+            return
+        # Las facturas que otro proceso está certificando se omiten (sin esperar su bloqueo)
+        if self.env.context.get('l10n_gt_edi_claimed'):
+            moves = self
+        else:
+            moves = self._l10n_gt_edi_claim_for_certification(move_ids=self.ids)
+        if len(moves) < len(self):
+            logging.info("FEL Lote: %s facturas omitidas, ya las está certificando otro proceso",
+                         len(self) - len(moves))
+        if not moves:
+            return
+        policy, every = moves._l10n_gt_edi_get_commit_policy()
+
+        # Un envío anterior sin respuesta pudo haberse certificado: consultar antes de reenviar
+        recovered = moves._l10n_gt_edi_recover_in_flight()
+        if recovered and policy == 'invoice':
+            self._cr.commit()
+        uncommitted = len(recovered) if policy in ('every_n', 'batch') else 0
+
+        # Desde el barrido de pendientes (l10n_gt_edi_claimed) cualquier error al preparar
+        # una factura se aísla en su savepoint: si no, el mismo bloque (ORDER BY id) fallaría
+        # en cada ejecución del cron y bloquearía todo el backlog
+        isolate = self.env.context.get('l10n_gt_edi_claimed')
+        payloads = []
+        metric_vals = []
+        for move in moves - recovered:
+            timings = {}
+            try:
+                with self.env.cr.savepoint() if isolate else nullcontext():
+                    payload = move._l10n_gt_edi_prepare_send(timings)
+            except UserError as e:
+                # Un error de datos en una factura no debe detener el lote
+                move._l10n_gt_edi_create_document_invoice_sending_failed({'errors': [str(e)]})
+                payload = None
+            except Exception as e:
+                if not isolate:
+                    raise
+                logging.exception("FEL Pendientes: Error al preparar la factura %s", move.name)
+                move._l10n_gt_edi_create_document_invoice_sending_failed({
+                    'errors': [_("Error inesperado al generar el XML: %s", e)],
+                })
+                payload = None
+            if payload:
+                payloads.append(payload)
+            else:
+                metric_vals.append(move._l10n_gt_edi_get_send_metric_vals(timings, False))
+
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_gt_edi.batch_max_workers', DEFAULT_BATCH_MAX_WORKERS))
+        logging.info("FEL Lote: Enviando %s facturas a Infile con %s hilos", len(payloads), max_workers)
+
+        # El modo DEMO no hace peticiones HTTP: se resuelve en el hilo principal
+        demo_payloads = [p for p in payloads if p['credentials']['service_provider'] == 'demo']
+        infile_payloads = [p for p in payloads if p['credentials']['service_provider'] != 'demo']
+
+        def send(payload):
+            with _l10n_gt_edi_timer(payload['timings'], 'http'):
+                return _l10n_gt_edi_infile_certify(
+                    payload['credentials'], payload['xml_data'], payload['identification_key'],
+                )
+
+        results = []
+        for payload in demo_payloads:
+            with _l10n_gt_edi_timer(payload['timings'], 'http'):
+                results.append(self._l10n_gt_edi_send_payload(payload))
+        # Por tandas según el límite de peticiones de la compañía certificadora
+        results += self.env['l10n_gt_edi.rate.bucket']._run_rate_limited(
+            infile_payloads, lambda batch: _l10n_gt_edi_run_in_pool(send, batch, max_workers),
+        )
+
+        for payload, result in zip(demo_payloads + infile_payloads, results):
+            move = payload['move']
+            success = move._l10n_gt_edi_process_send_result_in_savepoint(payload, result)
+            metric_vals.append(move._l10n_gt_edi_get_send_metric_vals(payload['timings'], success))
+            if policy == 'invoice':
+                if success:
+                    self._cr.commit()
+            elif policy in ('every_n', 'batch'):
+                uncommitted += 1
+                if policy == 'every_n' and uncommitted >= every:
+                    self._cr.commit()
+                    uncommitted = 0
+
+        self.env['l10n_gt_edi.send.metric']._record(metric_vals)
+        moves._l10n_gt_edi_release_claim()
+        if uncommitted or policy == 'invoice':
+            self._cr.commit()
+
+    # =========================================================================
+    # RECLAMO DE FACTURAS PARA CERTIFICACIÓN (varios workers)
+    # =========================================================================
+
+    @api.model
+    def _l10n_gt_edi_claim_for_certification(self, move_ids=None, company_ids=None, limit=None, pending_only=False,
+                                             certifiable_only=True):
+        """
+        Reclama facturas pendientes de certificar con una sola sentencia:
+        las selecciona con FOR UPDATE SKIP LOCKED y marca l10n_gt_edi_claimed_at.
+
+        Las facturas bloqueadas por otra transacción o reclamadas por otro proceso
+        (hace menos de CLAIM_STALE_MINUTES) se omiten en lugar de esperar, así varios
+        workers pueden repartirse el mismo backlog sin enviar dos veces una factura.
+        El reclamo se libera con _l10n_gt_edi_release_claim().
+
+        Args:
+            move_ids (list): limitar a estas facturas.
+            company_ids (list): limitar a estas compañías.
+            limit (int): máximo de facturas a reclamar.
+            pending_only (bool): solo facturas con l10n_gt_edi_pending_certification
+                (usa el índice parcial del backlog).
+            certifiable_only (bool): solo facturas de cliente publicadas sin documento
+                FEL certificado o anulado. Con False solo se omiten las bloqueadas o
+                reclamadas por otro proceso.
+
+        Returns:
+            account.move: facturas reclamadas.
+        """
+        conditions = [SQL("""
+            (
+                move.l10n_gt_edi_claimed_at IS NULL
+                OR move.l10n_gt_edi_claimed_at < (NOW() AT TIME ZONE 'UTC') - make_interval(mins => %s)
+            )
+        """, CLAIM_STALE_MINUTES)]
+        if certifiable_only:
+            conditions.append(SQL("""
+                move.state = 'posted'
+                AND move.move_type IN ('out_invoice', 'out_refund')
+                AND NOT EXISTS (
+                    SELECT 1
+                      FROM l10n_gt_edi_document doc
+                     WHERE doc.invoice_id = move.id
+                       AND doc.state IN ('invoice_sent', 'invoice_cancelled')
+                )
+            """))
+        if move_ids is not None:
+            conditions.append(SQL("move.id = ANY(%s)", list(move_ids)))
+        if company_ids is not None:
+            conditions.append(SQL("move.company_id = ANY(%s)", list(company_ids)))
+        if pending_only:
+            conditions.append(SQL("move.l10n_gt_edi_pending_certification"))
+
+        self.flush_model(['state', 'move_type', 'company_id', 'l10n_gt_edi_claimed_at', 'l10n_gt_edi_pending_certification'])
+        self.env['l10n_gt_edi.document'].flush_model(['invoice_id', 'state'])
+        self.env.cr.execute(SQL("""
+            UPDATE account_move
+               SET l10n_gt_edi_claimed_at = NOW() AT TIME ZONE 'UTC'
+             WHERE id IN (
+                    SELECT move.id
+                      FROM account_move move
+                     WHERE %(conditions)s
+                  ORDER BY move.id
+                     %(limit)s
+                       FOR UPDATE OF move SKIP LOCKED
+                   )
+         RETURNING id
+        """, conditions=SQL(" AND ").join(conditions), limit=SQL("LIMIT %s", limit) if limit else SQL()))
+        claimed = self.browse(sorted(row[0] for row in self.env.cr.fetchall()))
+        self.invalidate_model(['l10n_gt_edi_claimed_at'])
+        return claimed
+
+    @api.model
+    def _cron_l10n_gt_edi_certify_pending(self, chunk_size=None, max_chunks=None):
+        """
+        Certifica el backlog de facturas pendientes (l10n_gt_edi_pending_certification)
+        por bloques acotados, reclamándolas con SKIP LOCKED para poder tener varios
+        workers. Parámetros del sistema:
+
+        - l10n_gt_edi.sweeper_chunk_size: facturas por bloque.
+        - l10n_gt_edi.sweeper_max_chunks: bloques por ejecución del cron.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        chunk_size = chunk_size or int(ICP.get_param('l10n_gt_edi.sweeper_chunk_size', SWEEPER_CHUNK_SIZE))
+        max_chunks = max_chunks or int(ICP.get_param('l10n_gt_edi.sweeper_max_chunks', SWEEPER_MAX_CHUNKS))
+        processed = 0
+        for _chunk in range(max_chunks):
+            moves = self._l10n_gt_edi_claim_for_certification(limit=chunk_size, pending_only=True)
+            if not moves:
+                break
+            moves.with_context(l10n_gt_edi_claimed=True)._l10n_gt_edi_try_send_batch()
+            self.env.cr.commit()
+            self.env.invalidate_all()
+            processed += len(moves)
+            logging.info("FEL Pendientes: %s facturas procesadas en esta ejecución", processed)
+
+        if processed:
+            remaining = self.search_count([('l10n_gt_edi_pending_certification', '=', True)])
+            logging.info("FEL Pendientes: %s facturas procesadas, %s siguen pendientes", processed, remaining)
+
+    def _l10n_gt_edi_release_claim(self):
+        """Libera el reclamo de certificación de las facturas."""
+        if not self:
+            return
+        self.env.cr.execute("""
+            UPDATE account_move
+               SET l10n_gt_edi_claimed_at = NULL
+             WHERE id = ANY(%s)
+               AND l10n_gt_edi_claimed_at IS NOT NULL
+        """, [self.ids])
+        self.invalidate_recordset(['l10n_gt_edi_claimed_at'])
+
+    def _l10n_gt_edi_get_commit_policy(self):
+        """
+        Política de confirmación de la certificación masiva:
+
+        - 'invoice': commit tras cada factura certificada (comportamiento original).
+        - 'every_n': commit cada N facturas procesadas.
+        - 'batch': un solo commit al final del lote.
+        - 'none': nunca hace commit; lo decide quien llama (contexto l10n_gt_edi_no_commit).
+
+        En todas, cada factura se registra en su propio savepoint: un error al aplicar
+        el resultado de una factura solo deshace esa factura.
+        El contexto l10n_gt_edi_commit_policy tiene prioridad sobre la compañía.
+
+        Returns:
+            tuple: (política, N)
+        """
+        company = self.company_id[:1] or self.env.company
+        policy = self.env.context.get('l10n_gt_edi_commit_policy')
+        if not policy and self.env.context.get('l10n_gt_edi_no_commit'):
+            policy = 'none'
+        return (
+            policy or company.l10n_gt_edi_commit_policy or 'invoice',
+            max(1, company.l10n_gt_edi_commit_every or DEFAULT_COMMIT_EVERY),
+        )
+
+    def _l10n_gt_edi_process_send_result_in_savepoint(self, payload, result):
+        """
+        Registra el resultado del envío dentro de un savepoint. Si falla, solo se deshace
+        esta factura y se registra como envío fallido con su identificador, para
+        recuperar la certificación de INFILE en el siguiente intento.
+
+        Returns:
+            bool: True si la factura quedó certificada.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                return self._l10n_gt_edi_process_send_result(payload, result)
+        except Exception as e:
+            logging.exception("FEL Lote: Error registrando el resultado de %s", self.name)
+            self._l10n_gt_edi_process_send_result(payload, {
+                'errors': [_("Error registrando la respuesta de INFILE: %s", e)],
+                'in_flight': 'errors' not in result,
+            })
+            return False
+
+    def _l10n_gt_edi_prepare_send(self, timings=None):
+        """
+        Validación previa y construcción del XML a enviar.
+
+        Args:
+            timings (dict): si se indica, acumula la duración (ms) de cada etapa.
+
+        Returns:
+            dict: datos necesarios para el envío, o None si la validación previa falló
+                  (en ese caso ya se creó el documento de error).
+        """
+        self.ensure_one()
+        timings = {} if timings is None else timings
 
         # Pre-send validation
-        if errors := self._l10n_gt_edi_get_pre_send_errors():
+        with _l10n_gt_edi_timer(timings, 'validation'):
+            errors = self._l10n_gt_edi_get_pre_send_errors()
+        if errors:
             self._l10n_gt_edi_create_document_invoice_sending_failed({'errors': errors})
-            return
+            return None
 
         # Construct the XML
-        gt_values = {}
-        self._l10n_gt_edi_add_base_values(gt_values)
-        if gt_values['have_exportacion']:
-            self._l10n_gt_edi_add_export_values(gt_values)
-        if gt_values['have_referencias']:
-            self._l10n_gt_edi_add_reference_values(gt_values)
-        if gt_values['have_cambiaria']:
-            self._l10n_gt_edi_add_payment_values(gt_values)
+        with _l10n_gt_edi_timer(timings, 'values'):
+            gt_values = {}
+            self._l10n_gt_edi_add_base_values(gt_values)
+            if gt_values['have_exportacion']:
+                self._l10n_gt_edi_add_export_values(gt_values)
+            if gt_values['have_referencias']:
+                self._l10n_gt_edi_add_reference_values(gt_values)
+            if gt_values['have_cambiaria']:
+                self._l10n_gt_edi_add_payment_values(gt_values)
+
+        # Renderizar una sola vez, transformar el árbol en memoria y serializar al final
+        with _l10n_gt_edi_timer(timings, 'render'):
+            root = self._l10n_gt_edi_render_xml_tree(gt_values)
+        self._l10n_gt_edi_apply_xml_transforms(root, timings)
+        with _l10n_gt_edi_timer(timings, 'serialize'):
+            # Bytes UTF-8 compactos: lo que viaja a INFILE (la versión legible se genera al descargar)
+            xml_data = _l10n_gt_edi_serialize_compact(root)
+
+        static_data = self._l10n_gt_edi_get_static_fel_data()
 
-        xml_data = self.env['ir.qweb']._render('l10n_gt_edi.SAT', gt_values)
-        xml_data = etree.tostring(cleanup_xml_node(xml_data, remove_blank_nodes=False), pretty_print=True, encoding='unicode')
+        return {
+            'move': self,
+            'company_id': static_data['certifying_company_id'],
+            'credentials': static_data['credentials'],
+            'xml_data': xml_data,
+            'identification_key': self._l10n_gt_edi_get_identification_key(),
+            'timings': timings,
+        }
+
+    def _l10n_gt_edi_get_identification_key(self):
+        """Identificador del DTE ante INFILE; INFILE no certifica dos veces el mismo identificador."""
+        self.ensure_one()
+        db_uuid = self.env['ir.config_parameter'].sudo().get_param('database.uuid')
+        return f"{db_uuid}_{self._l10n_gt_edi_get_name()}"
 
-        # MODIFICACIÓN: Agregar datos de Receptor (CorreoReceptor, DireccionReceptor)
-        logging.info("RECEPTOR: Llamando a _l10n_gt_edi_modify_receptor")
-        xml_data = self._l10n_gt_edi_modify_receptor(xml_data)
+    # =========================================================================
+    # RECUPERACIÓN DE CERTIFICACIONES SIN RESPUESTA
+    # =========================================================================
 
-        # MODIFICACIÓN: Agregar campos adicionales al complemento de exportación
-        logging.info("EXPORTACIÓN: Llamando a _l10n_gt_edi_modify_exportacion")
-        xml_data = self._l10n_gt_edi_modify_exportacion(xml_data)
+    def _l10n_gt_edi_needs_recovery(self):
+        """
+        Indica si un envío anterior pudo haberse certificado sin que recibiéramos
+        la respuesta: documento de error con identificador (timeout, conexión cortada)
+        o reintento de la cola tras un worker caído (contexto l10n_gt_edi_recover_in_flight).
+        """
+        self.ensure_one()
+        if self.l10n_gt_edi_state == 'invoice_sent':
+            return False
+        if self.env.context.get('l10n_gt_edi_recover_in_flight'):
+            return True
+        return any(
+            doc.state == 'invoice_sending_failed' and doc.identification_key
+            for doc in self.l10n_gt_edi_document_ids
+        )
 
-        # MODIFICACIÓN: Agregar Adenda personalizada
-        logging.info("ADENDA: Llamando a _l10n_gt_edi_modify_adenda")
-        xml_data = self._l10n_gt_edi_modify_adenda(xml_data)
+    def _l10n_gt_edi_recover_in_flight(self):
+        """
+        Recupera las facturas cuyo envío anterior quedó sin respuesta reenviando a INFILE
+        el mismo XML con el mismo identificador, guardados en el documento de error:
+        INFILE no certifica dos veces un identificador y responde con el DTE que ya
+        había certificado (o lo certifica si el envío anterior no llegó).
 
-        sudo_root_company = self.company_id.sudo().parent_ids.filtered('partner_id.vat')[-1:] or self.company_id.sudo().root_id
+        Sin documento de error con XML (p.ej. worker caído durante el envío) la factura
+        sigue la ruta normal, que también envía con el mismo identificador
+        (ver _l10n_gt_edi_get_identification_key).
 
-        # Send the XML to Infile
-        db_uuid = self.env['ir.config_parameter'].sudo().get_param('database.uuid')
-        result = _l10n_gt_edi_send_to_sat(
-            company=sudo_root_company,
-            xml_data=xml_data,
-            identification_key=f"{db_uuid}_{self._l10n_gt_edi_get_name()}",
+        Returns:
+            account.move: facturas recuperadas.
+        """
+        resends = []
+        for move in self.filtered(lambda m: m._l10n_gt_edi_needs_recovery()):
+            credentials = move._l10n_gt_edi_get_static_fel_data()['credentials']
+            if credentials['service_provider'] == 'demo':
+                continue
+            failed_doc = move.l10n_gt_edi_document_ids.filtered(
+                lambda d: d.state == 'invoice_sending_failed' and d.identification_key and d.attachment_id
+            ).sorted('id')[-1:]
+            if not failed_doc:
+                continue
+            resends.append({
+                'move': move,
+                'credentials': credentials,
+                'identification_key': failed_doc.identification_key,
+                'xml_data': failed_doc.attachment_id.raw,
+            })
+        if not resends:
+            return self.browse()
+
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_gt_edi.batch_max_workers', DEFAULT_BATCH_MAX_WORKERS))
+
+        def resend(payload):
+            return _l10n_gt_edi_infile_certify(
+                payload['credentials'], payload['xml_data'], payload['identification_key'],
+            )
+
+        results = self.env['l10n_gt_edi.rate.bucket']._run_rate_limited(
+            resends, lambda batch: _l10n_gt_edi_run_in_pool(resend, batch, max_workers),
         )
 
-        # Remove all previous error documents
-        self.l10n_gt_edi_document_ids.filtered(lambda d: d.state == 'invoice_sending_failed').unlink()
+        recovered = self.browse()
+        for payload, result in zip(resends, results):
+            if 'errors' in result:
+                # Se deja a la ruta normal (mismo identificador), que registra el error
+                continue
+            move = payload['move']
+            if move._l10n_gt_edi_process_send_result_in_savepoint(payload, result):
+                move.message_post(body=_(
+                    "Certificación FEL recuperada: se reenvió a INFILE el XML del envío sin "
+                    "respuesta con el mismo identificador (%s).",
+                    payload['identification_key'],
+                ))
+                recovered |= move
+        logging.info("FEL Recuperación: %s de %s facturas con envío sin respuesta quedaron certificadas",
+                     len(recovered), len(resends))
+        return recovered
+
+    @api.model
+    def _l10n_gt_edi_send_payload(self, payload):
+        """
+        Envía a Infile el XML preparado por _l10n_gt_edi_prepare_send,
+        usando la sesión HTTP (keep-alive) de la compañía certificadora.
+        En modo DEMO delega en l10n_gt_edi, que no hace peticiones HTTP.
+        """
+        from odoo.addons.l10n_gt_edi.models.utils import _l10n_gt_edi_send_to_sat
+
+        try:
+            if payload['credentials']['service_provider'] == 'demo':
+                return _l10n_gt_edi_send_to_sat(
+                    company=self.env['res.company'].sudo().browse(payload['company_id']),
+                    xml_data=payload['xml_data'].decode(),
+                    identification_key=payload['identification_key'],
+                )
+            return _l10n_gt_edi_infile_certify(
+                payload['credentials'], payload['xml_data'], payload['identification_key'],
+            )
+        except Exception as e:
+            logging.exception("FEL: Error inesperado enviando %s", payload['identification_key'])
+            return {'errors': [str(e)]}
+
+    def _l10n_gt_edi_process_send_result(self, payload, result):
+        """
+        Registra el resultado del envío en la factura.
+
+        Returns:
+            bool: True si la factura quedó certificada.
+        """
+        self.ensure_one()
+        xml_data = payload['xml_data']
+
+        with _l10n_gt_edi_timer(payload.setdefault('timings', {}), 'document'):
+            # Remove all previous error documents
+            self.l10n_gt_edi_document_ids.filtered(lambda d: d.state == 'invoice_sending_failed').unlink()
+
+            # Create Error/Successful Document
+            if 'errors' in result:
+                self._l10n_gt_edi_create_document_invoice_sending_failed({**result, 'xml': xml_data})
+                if result.get('circuit_open') or result.get('rate_limited'):
+                    # INFILE no disponible o sin turnos: no se envió, se reintenta desde la cola
+                    self.env['l10n_gt_edi.certification.job']._enqueue(self)
+                if result.get('in_flight'):
+                    # INFILE pudo haberlo certificado: guardar el identificador para recuperarlo
+                    self.l10n_gt_edi_document_ids.filtered(
+                        lambda d: d.state == 'invoice_sending_failed'
+                    ).sorted('id')[-1:].identification_key = payload['identification_key']
+                return False
 
-        # Create Error/Successful Document
-        if 'errors' in result:
-            self._l10n_gt_edi_create_document_invoice_sending_failed({**result, 'xml': xml_data})
-        else:
             self._l10n_gt_edi_create_document_invoice_sent(result)
 
             # AUTO-LLENAR: Copiar series y serial_number a account.move
             self._l10n_gt_edi_update_invoice_fel_fields(result)
 
             self.message_post(body=_("Successfully sent the XML to the SAT"), attachment_ids=self.l10n_gt_edi_attachment_id.ids)
-            if sudo_root_company.l10n_gt_edi_service_provider == 'demo':
+            if payload['credentials']['service_provider'] == 'demo':
                 self.message_post(body=_("This document has been successfully generated in DEMO mode. "
                                          "It is considered as accepted and it won't be sent to the SAT."))
-            self._cr.commit()
+        return True
+
+    def _l10n_gt_edi_get_send_metric_vals(self, timings, success):
+        """Valores para l10n_gt_edi.send.metric, o None si la compañía no recolecta métricas."""
+        self.ensure_one()
+        if not self.company_id.l10n_gt_edi_collect_metrics:
+            return None
+        return {
+            'move_id': self.id,
+            'company_id': self.company_id.id,
+            'journal_id': self.journal_id.id,
+            'success': success,
+            'validation_ms': timings.get('validation', 0.0),
+            'values_ms': timings.get('values', 0.0),
+            'render_ms': timings.get('render', 0.0),
+            'transform_ms': sum(ms for stage, ms in timings.items() if stage.startswith('transform:')),
+            'serialize_ms': timings.get('serialize', 0.0),
+            'http_ms': timings.get('http', 0.0),
+            'document_ms': timings.get('document', 0.0),
+            'stage_timings': timings,
+        }
+
+    # =========================================================================
+    # PIPELINE DE TRANSFORMACIÓN DEL XML
+    # =========================================================================
+
+    def _l10n_gt_edi_render_xml_tree(self, gt_values):
+        """Renderiza la plantilla l10n_gt_edi.SAT y devuelve el elemento raíz (sin serializar)."""
+        self.ensure_one()
+        xml_data = self.env['ir.qweb']._render('l10n_gt_edi.SAT', gt_values)
+        return cleanup_xml_node(xml_data, remove_blank_nodes=False)
+
+    def _l10n_gt_edi_get_xml_transforms(self):
+        """
+        Etapas de transformación del XML, en el orden en que se aplican.
+        Cada etapa es un método que recibe el elemento raíz y lo modifica en sitio.
+        Otros módulos pueden extender la lista sobrescribiendo este método.
+        """
+        return [
+            # Datos de Receptor (CorreoReceptor, DireccionReceptor)
+            '_l10n_gt_edi_modify_receptor',
+            # Campos adicionales del complemento de exportación
+            '_l10n_gt_edi_modify_exportacion',
+            # Adenda personalizada
+            '_l10n_gt_edi_modify_adenda',
+        ]
+
+    def _l10n_gt_edi_apply_xml_transforms(self, root, timings=None):
+        """Aplica todas las etapas de transformación sobre el mismo árbol en memoria."""
+        self.ensure_one()
+        timings = {} if timings is None else timings
+        for stage in self._l10n_gt_edi_get_xml_transforms():
+            logging.info("FEL XML: Aplicando etapa %s", stage)
+            with _l10n_gt_edi_timer(timings, f'transform:{stage}'):
+                getattr(self, stage)(root)
+        return root
 
     def _l10n_gt_edi_update_invoice_fel_fields(self, result):
         """
@@ -648,26 +1462,215 @@ class AccountMove(models.Model):
         Se puede llamar manualmente o desde un cron/action.
         Útil para actualización retroactiva de facturas existentes.
         """
-        for move in self:
-            fel_doc = move.l10n_gt_edi_document_ids.filtered(
-                lambda d: d.state == 'invoice_sent'
-            ).sorted('id', reverse=True)[:1]
-
-            if fel_doc:
-                vals = {}
-                if 'invoice_series' in move._fields and fel_doc.series:
-                    vals['invoice_series'] = fel_doc.series
-                if 'invoice_number' in move._fields and fel_doc.serial_number:
-                    vals['invoice_number'] = fel_doc.serial_number
-                if 'x_studio_serie' in move._fields and fel_doc.series:
-                    vals['x_studio_serie'] = fel_doc.series
-                if 'x_studio_nmero_de_dte' in move._fields and fel_doc.serial_number:
-                    vals['x_studio_nmero_de_dte'] = fel_doc.serial_number
-
-                if vals:
-                    move.write(vals)
-                    logging.info("FEL Sync: Factura %s actualizada - Serie: %s, Número: %s",
-                                 move.name, fel_doc.series, fel_doc.serial_number)
+        updated = self._l10n_gt_edi_sync_fel_fields(self.ids)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Sincronizar campos FEL"),
+                'message': _("%(updated)s de %(total)s facturas actualizadas.", updated=updated, total=len(self)),
+                'type': 'success',
+            },
+        }
+
+    @api.model
+    def _l10n_gt_edi_get_fel_number_fields(self):
+        """Campos de la factura que reflejan la serie/número FEL: {campo: 'series' | 'serial_number'}."""
+        candidates = {
+            'invoice_series': 'series',
+            'invoice_number': 'serial_number',
+            'x_studio_serie': 'series',
+            'x_studio_nmero_de_dte': 'serial_number',
+        }
+        return {
+            fname: source
+            for fname, source in candidates.items()
+            if fname in self._fields and self._fields[fname].store
+        }
+
+    @api.model
+    def _l10n_gt_edi_sync_fel_fields(self, move_ids, chunk_size=FEL_SYNC_CHUNK_SIZE):
+        """
+        Sincroniza por bloques los campos FEL de las facturas indicadas.
+        Limpia la caché entre bloques para no acumular registros en memoria.
+
+        Returns:
+            int: número de facturas actualizadas.
+        """
+        total = len(move_ids)
+        done = updated = 0
+        for chunk in split_every(chunk_size, sorted(move_ids)):
+            updated += self._l10n_gt_edi_sync_fel_fields_chunk(list(chunk))
+            done += len(chunk)
+            self.env.flush_all()
+            self.env.invalidate_all()
+            logging.info("FEL Sync: %s/%s facturas procesadas, %s actualizadas", done, total, updated)
+        return updated
+
+    @api.model
+    def _l10n_gt_edi_sync_fel_fields_chunk(self, move_ids):
+        """
+        Sincroniza un bloque de facturas: una consulta para el último documento enviado
+        de cada factura, una lectura de los valores actuales y un write por cada
+        grupo de valores idénticos.
+
+        Returns:
+            int: número de facturas actualizadas.
+        """
+        target_fields = self._l10n_gt_edi_get_fel_number_fields()
+        if not target_fields or not move_ids:
+            return 0
+
+        self.env['l10n_gt_edi.document'].flush_model(['invoice_id', 'state', 'series', 'serial_number'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (invoice_id) invoice_id, series, serial_number
+              FROM l10n_gt_edi_document
+             WHERE state = 'invoice_sent'
+               AND invoice_id = ANY(%s)
+          ORDER BY invoice_id, id DESC
+        """, [move_ids])
+        latest = {invoice_id: {'series': series, 'serial_number': number}
+                  for invoice_id, series, number in self.env.cr.fetchall()}
+        if not latest:
+            return 0
+
+        current = {
+            values['id']: values
+            for values in self.browse(list(latest)).read(list(target_fields))
+        }
+
+        # Agrupar facturas con exactamente los mismos valores a escribir
+        writes = defaultdict(list)
+        for move_id, doc_values in latest.items():
+            vals = {
+                fname: doc_values[source]
+                for fname, source in target_fields.items()
+                if doc_values[source] and current[move_id][fname] != doc_values[source]
+            }
+            if vals:
+                writes[tuple(sorted(vals.items()))].append(move_id)
+
+        for vals, ids in writes.items():
+            self.browse(ids).write(dict(vals))
+        return sum(len(ids) for ids in writes.values())
+
+    @api.model
+    def _cron_l10n_gt_edi_sync_fel_fields(self, chunk_size=FEL_SYNC_CHUNK_SIZE):
+        """
+        Sincronización retroactiva de todo el histórico.
+        Guarda el último ID procesado en un parámetro del sistema y confirma
+        cada bloque, por lo que se puede interrumpir y retomar.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_id = int(ICP.get_param(FEL_SYNC_CHECKPOINT_PARAM, 0))
+        updated = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT DISTINCT invoice_id
+                  FROM l10n_gt_edi_document
+                 WHERE state = 'invoice_sent'
+                   AND invoice_id > %s
+              ORDER BY invoice_id
+                 LIMIT %s
+            """, [last_id, chunk_size])
+            move_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not move_ids:
+                break
+
+            updated += self._l10n_gt_edi_sync_fel_fields_chunk(move_ids)
+            last_id = move_ids[-1]
+            ICP.set_param(FEL_SYNC_CHECKPOINT_PARAM, last_id)
+            self.env.cr.commit()
+            self.env.invalidate_all()
+            logging.info("FEL Sync: Histórico procesado hasta la factura ID %s, %s actualizadas", last_id, updated)
+
+        logging.info("FEL Sync: Sincronización del histórico terminada, %s facturas actualizadas", updated)
+
+    # =========================================================================
+    # MIGRACIÓN DE CAMPOS FEL LEGACY A l10n_gt_edi.document
+    # =========================================================================
+
+    @api.model
+    def _cron_l10n_gt_edi_migrate_legacy_fel(self, chunk_size=FEL_SYNC_CHUNK_SIZE):
+        """
+        Crea documentos FEL 'invoice_sent' para las facturas publicadas que fueron
+        certificadas con el módulo legacy (UUID en firma_fel/uuid_fel) y aún no
+        tienen documento nativo. Así las NC/ND contra esas facturas usan la ruta
+        nativa indexada en lugar de las columnas legacy.
+
+        Recorre las facturas por ID en bloques, guarda el último ID procesado en un
+        parámetro del sistema y confirma cada bloque: se puede interrumpir y retomar.
+        """
+        uuid_columns = [
+            fname for fname in FEL_LEGACY_ORIGIN_COLUMNS['uuid'][:FEL_LEGACY_CERTIFIED_DEPTH]
+            if self._l10n_gt_edi_is_stored_column(fname)
+        ]
+        if not uuid_columns:
+            logging.info("FEL Migración: No hay columnas legacy de UUID en esta base")
+            return
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_id = int(ICP.get_param(FEL_LEGACY_MIGRATION_CHECKPOINT_PARAM, 0))
+        has_legacy_uuid = SQL(" OR ").join(
+            SQL("COALESCE(move.%s, '') != ''", SQL.identifier(fname))
+            for fname in uuid_columns
+        )
+        created = 0
+        while True:
+            self.env.cr.execute(SQL("""
+                SELECT move.id
+                  FROM account_move move
+                 WHERE move.id > %(last_id)s
+                   AND move.state = 'posted'
+                   AND move.move_type IN ('out_invoice', 'out_refund')
+                   AND (%(has_legacy_uuid)s)
+                   AND NOT EXISTS (
+                        SELECT 1
+                          FROM l10n_gt_edi_document doc
+                         WHERE doc.invoice_id = move.id
+                           AND doc.state IN ('invoice_sent', 'invoice_cancelled')
+                   )
+              ORDER BY move.id
+                 LIMIT %(limit)s
+            """, last_id=last_id, has_legacy_uuid=has_legacy_uuid, limit=chunk_size))
+            move_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not move_ids:
+                break
+
+            created += len(self.browse(move_ids)._l10n_gt_edi_migrate_legacy_fel_chunk())
+            last_id = move_ids[-1]
+            ICP.set_param(FEL_LEGACY_MIGRATION_CHECKPOINT_PARAM, last_id)
+            self.env.cr.commit()
+            self.env.invalidate_all()
+            logging.info("FEL Migración: Procesado hasta la factura ID %s, %s documentos creados", last_id, created)
+
+        logging.info("FEL Migración: Migración de campos legacy terminada, %s documentos creados", created)
+
+    def _l10n_gt_edi_migrate_legacy_fel_chunk(self):
+        """
+        Crea en una sola llamada los documentos FEL de un bloque de facturas legacy,
+        con los datos de _l10n_gt_edi_resolve_origin_fel_data(). Omite las facturas
+        sin UUID, serie y número legacy completos.
+
+        Returns:
+            l10n_gt_edi.document: documentos creados.
+        """
+        vals_list = []
+        for move_id, data in self._l10n_gt_edi_resolve_origin_fel_data().items():
+            if data['source'] != 'legacy' or not data['certified'] or not data['series']:
+                continue
+            emission_date = fields.Date.to_date(data['date'])
+            vals_list.append({
+                'invoice_id': move_id,
+                'state': 'invoice_sent',
+                'uuid': data['uuid'],
+                'series': data['series'],
+                'serial_number': data['serial_number'],
+                # Mediodía UTC: conserva la fecha de emisión en hora de Guatemala
+                'datetime': datetime.combine(emission_date, time(12)) if emission_date else False,
+                'message': _("Migrado desde campos FEL legacy"),
+            })
+        return self.env['l10n_gt_edi.document'].sudo().create(vals_list)
 
     # =========================================================================
     # ANULACIÓN FEL
@@ -679,25 +1682,29 @@ class AccountMove(models.Model):
         if self.l10n_gt_edi_state != 'invoice_sent':
             return False
         # Verificar que tiene documento FEL con UUID
-        fel_doc = self.l10n_gt_edi_document_ids.filtered(
-            lambda d: d.state == 'invoice_sent' and d.uuid
-        )
-        return bool(fel_doc)
+        return bool(self._l10n_gt_edi_get_sent_document().uuid)
 
     def action_open_cancel_fel_wizard(self):
-        """Abre el wizard para anular factura FEL"""
-        self.ensure_one()
-        if not self._l10n_gt_edi_can_cancel():
+        """Abre el wizard para anular factura(s) FEL"""
+        if len(self) == 1 and not self._l10n_gt_edi_can_cancel():
             raise UserError(_("Esta factura no puede ser anulada en INFILE. "
                             "Debe estar en estado FEL 'Sent' con UUID válido."))
 
+        to_cancel = self.filtered(lambda m: m._l10n_gt_edi_can_cancel())
+        if not to_cancel:
+            raise UserError(_("Ninguna de las facturas seleccionadas puede ser anulada en INFILE. "
+                            "Deben estar en estado FEL 'Sent' con UUID válido."))
+
         return {
-            'name': _('Anular Factura FEL'),
+            'name': _('Anular Factura FEL') if len(to_cancel) == 1 else _('Anular Facturas FEL'),
             'type': 'ir.actions.act_window',
             'res_model': 'l10n_gt_edi.cancel.wizard',
             'view_mode': 'form',
             'target': 'new',
-            'context': {'default_move_id': self.id},
+            'context': {
+                'default_move_id': to_cancel[:1].id,
+                'default_move_ids': to_cancel.ids,
+            },
         }
 
     def _l10n_gt_edi_build_cancellation_xml(self, reason):
@@ -708,11 +1715,9 @@ class AccountMove(models.Model):
         ANULACION_NS = "http://www.sat.gob.gt/dte/fel/0.1.0"
 
         # Obtener documento FEL original
-        fel_doc = self.l10n_gt_edi_document_ids.filtered(
-            lambda d: d.state == 'invoice_sent' and d.uuid
-        ).sorted('id', reverse=True)[:1]
+        fel_doc = self._l10n_gt_edi_get_sent_document()
 
-        if not fel_doc:
+        if not fel_doc.uuid:
             raise UserError(_("No se encontró documento FEL válido para anular"))
 
         # Timezone Guatemala
@@ -749,79 +1754,49 @@ class AccountMove(models.Model):
         datos_generales.set('FechaHoraAnulacion', fecha_anulacion)
         datos_generales.set('MotivoAnulacion', (reason or 'Anulación solicitada')[:255])
 
-        xml_string = '<?xml version="1.0" encoding="UTF-8"?>\n' + etree.tostring(
-            root,
-            pretty_print=True,
-            encoding='unicode'
-        )
+        xml_data = _l10n_gt_edi_serialize_compact(root)
 
         logging.info("FEL Anulación: XML generado para factura %s, UUID: %s",
                      self.name, fel_doc.uuid)
-        logging.info("FEL Anulación: XML completo:\n%s", xml_string)
+        logging.debug("FEL Anulación: XML completo: %s", xml_data)
 
-        return xml_string
+        return xml_data
 
-    def _l10n_gt_edi_send_cancellation(self, xml_data):
-        """Envía XML de anulación a INFILE"""
+    def _l10n_gt_edi_prepare_cancellation(self, reason):
+        """
+        Construye el XML de anulación y reúne lo necesario para enviarlo,
+        de forma que el envío no dependa del cursor (puede hacerse desde otro hilo).
+        """
         self.ensure_one()
-
-        company = self.company_id.sudo()
-        sudo_root_company = company.parent_ids.filtered('partner_id.vat')[-1:] or company.root_id
-
-        # Demo mode
-        if sudo_root_company.l10n_gt_edi_service_provider == 'demo':
-            logging.info("FEL Anulación: Modo DEMO - simulando respuesta exitosa")
-            return {
-                'resultado': True,
-                'uuid': 'DEMO-CANCEL-' + datetime.now().strftime('%Y%m%d%H%M%S'),
-                'descripcion': 'Anulación exitosa en modo DEMO',
-            }
-
         db_uuid = self.env['ir.config_parameter'].sudo().get_param('database.uuid')
 
-        try:
-            response = requests.post(
-                url="https://certificador.feel.com.gt/fel/procesounificado/transaccion/v2/xml",
-                headers={
-                    'UsuarioFirma': sudo_root_company.l10n_gt_edi_ws_prefix,
-                    'LlaveFirma': sudo_root_company.l10n_gt_edi_infile_token,
-                    'UsuarioApi': sudo_root_company.l10n_gt_edi_ws_prefix,
-                    'LlaveApi': sudo_root_company.l10n_gt_edi_infile_key,
-                    'identificador': f"ODOO_CANCEL_{db_uuid}_{self.id}_{datetime.now(timezone.utc):%Y%m%d%H%M%S}",
-                },
-                data=xml_data.encode('utf-8'),
-                timeout=60,
-            )
-            response.raise_for_status()
-            result = response.json()
-            logging.info("FEL Anulación: Respuesta de INFILE: %s", result)
-            return result
-        except JSONDecodeError as e:
-            logging.error("FEL Anulación: Error decodificando respuesta JSON: %s", e)
-            return {'errors': [f"Error en respuesta de INFILE: {str(e)}"]}
-        except requests.RequestException as e:
-            logging.error("FEL Anulación: Error de conexión: %s", e)
-            return {'errors': [f"Error de conexión con INFILE: {str(e)}"]}
-        except Exception as e:
-            logging.error("FEL Anulación: Error inesperado: %s", e)
-            return {'errors': [str(e)]}
+        return {
+            'move': self,
+            'reason': reason,
+            'credentials': self._l10n_gt_edi_get_static_fel_data()['credentials'],
+            'xml_data': self._l10n_gt_edi_build_cancellation_xml(reason),
+            'identification_key': f"ODOO_CANCEL_{db_uuid}_{self.id}_{datetime.now(timezone.utc):%Y%m%d%H%M%S}",
+        }
 
-    def _l10n_gt_edi_cancel_invoice(self, reason):
-        """Proceso completo de anulación FEL"""
+    def _l10n_gt_edi_send_cancellation(self, payload):
+        """Envía a INFILE la anulación preparada por _l10n_gt_edi_prepare_cancellation"""
         self.ensure_one()
+        return self.env['l10n_gt_edi.rate.bucket']._run_rate_limited([payload], lambda payloads: [
+            _l10n_gt_edi_infile_cancel(p['credentials'], p['xml_data'], p['identification_key'])
+            for p in payloads
+        ])[0]
 
-        logging.info("FEL Anulación: Iniciando anulación de factura %s", self.name)
-
-        # Construir XML
-        xml_data = self._l10n_gt_edi_build_cancellation_xml(reason)
+    def _l10n_gt_edi_process_cancellation_result(self, reason, result):
+        """
+        Registra en la factura el resultado de la anulación en INFILE.
 
-        # Enviar a INFILE
-        result = self._l10n_gt_edi_send_cancellation(xml_data)
+        Returns:
+            str: mensaje de error, o False si la anulación fue exitosa.
+        """
+        self.ensure_one()
 
         # Obtener documento original
-        fel_doc = self.l10n_gt_edi_document_ids.filtered(
-            lambda d: d.state == 'invoice_sent'
-        ).sorted('id', reverse=True)[:1]
+        fel_doc = self._l10n_gt_edi_get_sent_document()
 
         # Verificar resultado
         has_errors = 'errors' in result
@@ -849,34 +1824,107 @@ class AccountMove(models.Model):
 
             self.message_post(body=_("Error al anular en INFILE: %s") % error_msg)
             logging.error("FEL Anulación: Error - %s", error_msg)
+            return error_msg
+
+        # Anulación exitosa
+        cancellation_uuid = result.get('uuid', '')
+
+        fel_doc.write({
+            'state': 'invoice_cancelled',
+            'cancellation_uuid': cancellation_uuid,
+            'cancellation_date': fields.Datetime.now(),
+            'cancellation_reason': reason,
+        })
+
+        # Cancelar la factura en Odoo
+        self.button_cancel()
+
+        self.message_post(
+            body=_("Factura anulada exitosamente en INFILE. UUID Anulación: %s") % cancellation_uuid
+        )
+        logging.info("FEL Anulación: Éxito - Factura %s anulada, UUID: %s",
+                    self.name, cancellation_uuid)
+        return False
+
+    def _l10n_gt_edi_cancel_invoice(self, reason):
+        """Proceso completo de anulación FEL"""
+        self.ensure_one()
+
+        logging.info("FEL Anulación: Iniciando anulación de factura %s", self.name)
+
+        # Construir XML y enviarlo a INFILE
+        payload = self._l10n_gt_edi_prepare_cancellation(reason)
+        result = self._l10n_gt_edi_send_cancellation(payload)
+
+        if error_msg := self._l10n_gt_edi_process_cancellation_result(reason, result):
             raise UserError(_("Error al anular en INFILE: %s") % error_msg)
-        else:
-            # Anulación exitosa
-            cancellation_uuid = result.get('uuid', '')
-
-            fel_doc.write({
-                'state': 'invoice_cancelled',
-                'cancellation_uuid': cancellation_uuid,
-                'cancellation_date': fields.Datetime.now(),
-                'cancellation_reason': reason,
-            })
 
-            # Cancelar la factura en Odoo
-            self.button_cancel()
+    def _l10n_gt_edi_cancel_invoices(self, reason):
+        """
+        Anulación FEL de varias facturas a la vez.
+
+        Construye todos los XML de anulación, los envía a INFILE en un pool de hilos
+        acotado y registra el resultado de cada factura sin detener el lote.
 
-            self.message_post(
-                body=_("Factura anulada exitosamente en INFILE. UUID Anulación: %s") % cancellation_uuid
+        Returns:
+            dict: {'cancelled': account.move, 'failed': {move_id: mensaje_error}}
+        """
+        failed = {}
+        payloads = []
+        for move in self:
+            if not move._l10n_gt_edi_can_cancel():
+                failed[move.id] = _("No está certificada en FEL o no tiene UUID válido.")
+                continue
+            try:
+                payloads.append(move._l10n_gt_edi_prepare_cancellation(reason))
+            except UserError as e:
+                failed[move.id] = str(e)
+
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_gt_edi.batch_max_workers', DEFAULT_BATCH_MAX_WORKERS))
+        logging.info("FEL Anulación: Anulando %s facturas en INFILE con %s hilos", len(payloads), max_workers)
+
+        def cancel(payload):
+            return _l10n_gt_edi_infile_cancel(
+                payload['credentials'], payload['xml_data'], payload['identification_key'],
             )
-            logging.info("FEL Anulación: Éxito - Factura %s anulada, UUID: %s",
-                        self.name, cancellation_uuid)
+
+        results = self.env['l10n_gt_edi.rate.bucket']._run_rate_limited(
+            payloads, lambda batch: _l10n_gt_edi_run_in_pool(cancel, batch, max_workers),
+        )
+
+        cancelled = self.browse()
+        for payload, result in zip(payloads, results):
+            move = payload['move']
+            try:
+                with self.env.cr.savepoint():
+                    error_msg = move._l10n_gt_edi_process_cancellation_result(reason, result)
+            except UserError as e:
+                error_msg = str(e)
+            except Exception as e:
+                # INFILE ya anuló el documento: el error de una factura no debe deshacer las demás
+                logging.exception("FEL Anulación: Error registrando la anulación de %s", move.name)
+                error_msg = _("Error registrando la respuesta de INFILE (UUID anulación: %(uuid)s): %(error)s",
+                              uuid=result.get('uuid') or '-', error=e)
+            if error_msg:
+                failed[move.id] = error_msg
+            else:
+                cancelled |= move
+
+        # Las anulaciones ya existen en SAT: confirmarlas en Odoo cuanto antes
+        if cancelled and self._l10n_gt_edi_get_commit_policy()[0] != 'none':
+            self.env.cr.commit()
+
+        logging.info("FEL Anulación: Lote terminado - %s anuladas, %s con error", len(cancelled), len(failed))
+        return {'cancelled': cancelled, 'failed': failed}
 
     # =========================================================================
     # COMPLEMENTO DE EXPORTACIÓN - CAMPOS ADICIONALES
     # =========================================================================
 
-    def _l10n_gt_edi_modify_exportacion(self, xml_string):
+    def _l10n_gt_edi_modify_exportacion(self, root):
         """
-        Modifica el complemento de Exportación para agregar campos adicionales:
+        Modifica (en sitio) el complemento de Exportación para agregar campos adicionales:
         - NombreComprador
         - DireccionComprador
         - CodigoComprador
@@ -889,21 +1937,15 @@ class AccountMove(models.Model):
 
         # Solo aplica para facturas de exportación (basado en posición fiscal)
         if not self.is_export_invoice:
-            return xml_string
+            return
 
         logging.info("=== EXPORTACIÓN: Modificando complemento de exportación ===")
 
-        CEX_NS = "http://www.sat.gob.gt/face2/ComplementoExportaciones/0.1.0"
-        CEX = "{%s}" % CEX_NS
-
-        # Parsear el XML
-        root = etree.fromstring(xml_string.encode('utf-8'))
-
         # Buscar el elemento Exportacion
-        exportacion = root.find('.//{%s}Exportacion' % CEX_NS)
+        exportacion = next(iter(XPATH_EXPORTACION(root)), None)
         if exportacion is None:
             logging.warning("EXPORTACIÓN: No se encontró elemento Exportacion en el XML")
-            return xml_string
+            return
 
         logging.info("EXPORTACIÓN: Elemento Exportacion encontrado")
 
@@ -914,32 +1956,32 @@ class AccountMove(models.Model):
             direccion_comprador = self._l10n_gt_edi_build_partner_address(comprador)
 
             # Buscar si ya existe NombreComprador (para no duplicar)
-            nombre_comprador_elem = exportacion.find(CEX + 'NombreComprador')
+            nombre_comprador_elem = exportacion.find(CEX_NS + 'NombreComprador')
             if nombre_comprador_elem is None:
                 # Insertar después de CodigoConsignatarioODestinatario
-                codigo_consig = exportacion.find(CEX + 'CodigoConsignatarioODestinatario')
+                codigo_consig = exportacion.find(CEX_NS + 'CodigoConsignatarioODestinatario')
                 if codigo_consig is not None:
                     idx = list(exportacion).index(codigo_consig) + 1
                 else:
                     idx = len(exportacion)
 
                 # NombreComprador
-                nombre_comprador_elem = etree.Element(CEX + 'NombreComprador')
+                nombre_comprador_elem = etree.Element(CEX_NS + 'NombreComprador')
                 nombre_comprador_elem.text = (comprador.name or '-')[:70]
                 exportacion.insert(idx, nombre_comprador_elem)
                 logging.info("EXPORTACIÓN: NombreComprador agregado: %s", comprador.name)
 
                 # DireccionComprador
-                direccion_comprador_elem = etree.Element(CEX + 'DireccionComprador')
+                direccion_comprador_elem = etree.Element(CEX_NS + 'DireccionComprador')
                 direccion_comprador_elem.text = direccion_comprador[:70]
                 exportacion.insert(idx + 1, direccion_comprador_elem)
                 logging.info("EXPORTACIÓN: DireccionComprador agregado: %s", direccion_comprador)
 
                 # CodigoComprador - usa el NIT/DPI del comprador
-                otra_ref = exportacion.find(CEX + 'OtraReferencia')
+                otra_ref = exportacion.find(CEX_NS + 'OtraReferencia')
                 if otra_ref is not None:
                     idx_codigo = list(exportacion).index(otra_ref)
-                    codigo_comprador_elem = etree.Element(CEX + 'CodigoComprador')
+                    codigo_comprador_elem = etree.Element(CEX_NS + 'CodigoComprador')
                     # Usar VAT (NIT/DPI) del comprador, limpiar guiones
                     codigo_comprador = (comprador.vat or '').replace('-', '').strip() or '.'
                     codigo_comprador_elem.text = codigo_comprador
@@ -950,30 +1992,27 @@ class AccountMove(models.Model):
         exportador = self.company_id.partner_id
         if exportador:
             # Buscar si ya existe NombreExportador
-            nombre_exportador_elem = exportacion.find(CEX + 'NombreExportador')
+            nombre_exportador_elem = exportacion.find(CEX_NS + 'NombreExportador')
             if nombre_exportador_elem is None:
                 # Insertar al final
-                nombre_exportador_elem = etree.SubElement(exportacion, CEX + 'NombreExportador')
-                nombre_exportador_elem.text = (self.company_id.name or exportador.name)[:70]
+                nombre_exportador_elem = etree.SubElement(exportacion, CEX_NS + 'NombreExportador')
+                nombre_exportador_elem.text = self._l10n_gt_edi_get_static_fel_data()['exportador_name']
                 logging.info("EXPORTACIÓN: NombreExportador agregado: %s", nombre_exportador_elem.text)
 
                 # CodigoExportador
-                codigo_exportador_elem = etree.SubElement(exportacion, CEX + 'CodigoExportador')
+                codigo_exportador_elem = etree.SubElement(exportacion, CEX_NS + 'CodigoExportador')
                 codigo_exportador_elem.text = '-'
                 logging.info("EXPORTACIÓN: CodigoExportador agregado: -")
 
         # Actualizar OtraReferencia si se especificó otra_referencia_fel
         if self.otra_referencia_fel:
-            otra_ref = exportacion.find(CEX + 'OtraReferencia')
+            otra_ref = exportacion.find(CEX_NS + 'OtraReferencia')
             if otra_ref is not None:
                 otra_ref.text = self.otra_referencia_fel
                 logging.info("EXPORTACIÓN: OtraReferencia actualizado: %s", self.otra_referencia_fel)
 
-        result_xml = etree.tostring(root, pretty_print=True, encoding='unicode')
         logging.info("=== EXPORTACIÓN: XML modificado exitosamente ===")
 
-        return result_xml
-
     def _l10n_gt_edi_build_partner_address(self, partner):
         """Construye la dirección completa de un partner para el complemento de exportación."""
         partes = []
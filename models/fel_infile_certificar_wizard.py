@@ -36,7 +36,7 @@ class CertificarWizardFix(models.TransientModel):
             not move.l10n_gt_edi_state and
             move.country_code == 'GT' and
             move.l10n_gt_edi_doc_type):
-            # Certificar en FEL
-            move._l10n_gt_edi_try_send()
+            # Certificar en FEL (o encolar si el diario certifica en segundo plano)
+            move._l10n_gt_edi_certify()
 
         return {'type': 'ir.actions.act_window_close'}
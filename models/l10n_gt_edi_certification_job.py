@@ -0,0 +1,218 @@
+import logging
+from datetime import timedelta
+
+from odoo import fields, models, api, _
+from odoo.exceptions import UserError
+
+# Reintentos con espera exponencial: 1, 2, 4, 8... minutos, con un máximo de 6 horas
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+# Tamaño del lote que toma cada ejecución del cron
+DEFAULT_BATCH_SIZE = 50
+
+# Trabajos 'running' más antiguos que esto se consideran abandonados (worker reiniciado)
+STALE_RUNNING_MINUTES = 30
+
+
+class L10nGtEdiCertificationJob(models.Model):
+    _name = 'l10n_gt_edi.certification.job'
+    _description = 'Trabajo de certificación FEL en cola'
+    _order = 'next_run_at, id'
+    _rec_name = 'move_id'
+
+    move_id = fields.Many2one(
+        'account.move',
+        string="Factura",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    company_id = fields.Many2one(
+        related='move_id.company_id',
+        store=True,
+    )
+    state = fields.Selection(
+        selection=[
+            ('pending', 'Pendiente'),
+            ('running', 'En proceso'),
+            ('done', 'Certificada'),
+            ('failed', 'Fallida'),
+        ],
+        string="Estado",
+        default='pending',
+        required=True,
+        index=True,
+    )
+    attempts = fields.Integer(string="Intentos", default=0, readonly=True)
+    max_attempts = fields.Integer(string="Máximo de Intentos", default=DEFAULT_MAX_ATTEMPTS)
+    next_run_at = fields.Datetime(
+        string="Próxima Ejecución",
+        default=fields.Datetime.now,
+        required=True,
+    )
+    date_done = fields.Datetime(string="Fecha de Certificación", readonly=True)
+    last_error = fields.Text(string="Último Error", readonly=True)
+
+    _pending_next_run_idx = models.Index("(next_run_at, id) WHERE state = 'pending'")
+
+    # =========================================================================
+    # ENCOLAR
+    # =========================================================================
+
+    @api.model
+    def _enqueue(self, moves):
+        """
+        Encola la certificación FEL de las facturas indicadas.
+        No crea un segundo trabajo si la factura ya tiene uno pendiente o en proceso.
+        """
+        if not moves:
+            return self.browse()
+
+        # Los usuarios de facturación pueden encolar aunque no administren la cola
+        already_queued = self.sudo().search([
+            ('move_id', 'in', moves.ids),
+            ('state', 'in', ('pending', 'running')),
+        ]).move_id
+        to_queue = moves - already_queued
+        jobs = self.sudo().create([{'move_id': move.id} for move in to_queue])
+
+        for move in to_queue:
+            move.message_post(body=_("Certificación FEL en cola. Se procesará en segundo plano."))
+
+        # Despertar al cron sin esperar al próximo intervalo
+        self.env.ref('adroc_l10n_gt_edi_adenda.ir_cron_l10n_gt_edi_certification_job')._trigger()
+        logging.info("FEL Cola: %s facturas encoladas (%s ya estaban en cola)", len(to_queue), len(already_queued))
+        return jobs
+
+    # =========================================================================
+    # PROCESAMIENTO (CRON)
+    # =========================================================================
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Vacía la cola de certificación por lotes.
+
+        Los trabajos se toman con FOR UPDATE SKIP LOCKED, por lo que se pueden
+        duplicar los cron de la cola para tener varios workers sin enviar dos
+        veces la misma factura.
+        """
+        self._reset_stale_jobs()
+        while jobs := self._claim_jobs(batch_size):
+            jobs._process()
+            self.env.cr.commit()
+
+    @api.model
+    def _reset_stale_jobs(self):
+        """Devuelve a 'pending' los trabajos que quedaron 'running' por un worker caído."""
+        self.env.cr.execute("""
+            UPDATE l10n_gt_edi_certification_job
+               SET state = 'pending', attempts = attempts + 1, write_date = NOW() AT TIME ZONE 'UTC'
+             WHERE state = 'running'
+               AND write_date < (NOW() AT TIME ZONE 'UTC') - make_interval(mins => %s)
+        """, [STALE_RUNNING_MINUTES])
+        if self.env.cr.rowcount:
+            logging.warning("FEL Cola: %s trabajos abandonados devueltos a pendiente", self.env.cr.rowcount)
+            self.invalidate_model(['state'])
+
+    @api.model
+    def _claim_jobs(self, limit):
+        """Marca como 'running' hasta `limit` trabajos listos y los confirma para otros workers."""
+        self.env.cr.execute("""
+            UPDATE l10n_gt_edi_certification_job
+               SET state = 'running', write_date = NOW() AT TIME ZONE 'UTC'
+             WHERE id IN (
+                    SELECT id
+                      FROM l10n_gt_edi_certification_job
+                     WHERE state = 'pending'
+                       AND next_run_at <= NOW() AT TIME ZONE 'UTC'
+                  ORDER BY next_run_at, id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+         RETURNING id
+        """, [limit])
+        job_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.commit()
+        self.invalidate_model(['state'])
+        return self.browse(job_ids)
+
+    def _process(self):
+        """Certifica las facturas de los trabajos y actualiza su estado."""
+        done = self.filtered(lambda j: j.move_id.l10n_gt_edi_state == 'invoice_sent')
+        done.write({'state': 'done', 'date_done': fields.Datetime.now()})
+        self.env.cr.commit()
+
+        to_send = (self - done).move_id.filtered(
+            lambda m: m.state == 'posted' and m.l10n_gt_edi_state in (False, 'invoice_sending_failed')
+        )
+        # En reintentos, el intento anterior pudo haberse certificado sin respuesta
+        retried = (self - done).filtered('attempts').move_id & to_send
+        batch_error = False
+        try:
+            retried.with_context(l10n_gt_edi_recover_in_flight=True)._l10n_gt_edi_try_send_batch()
+            (to_send - retried)._l10n_gt_edi_try_send_batch()
+        except Exception as e:
+            # Error que detuvo el lote: según la política de confirmación parte del lote
+            # ya pudo quedar confirmado, así que se vuelve a leer el estado de cada factura
+            self.env.cr.rollback()
+            self.env.invalidate_all()
+            if not isinstance(e, UserError):
+                logging.exception("FEL Cola: Error inesperado certificando el lote")
+            batch_error = str(e)
+
+        for job in self - done:
+            move = job.move_id
+            if move.l10n_gt_edi_state == 'invoice_sent':
+                job.write({'state': 'done', 'date_done': fields.Datetime.now(), 'last_error': False})
+            elif move.state != 'posted':
+                job._schedule_retry(_("La factura no está publicada."), final=True)
+            elif move.l10n_gt_edi_state not in (False, 'invoice_sending_failed'):
+                # Anulada o con anulación fallida: ya no se certifica
+                job._schedule_retry(
+                    _("La factura no se puede certificar en su estado FEL actual (%s).", move.l10n_gt_edi_state),
+                    final=True,
+                )
+            elif batch_error:
+                job._schedule_retry(batch_error)
+            else:
+                error_doc = move.l10n_gt_edi_document_ids.filtered(
+                    lambda d: d.state == 'invoice_sending_failed'
+                ).sorted('id', reverse=True)[:1]
+                # Sin documento de error: otro proceso la tenía reclamada (ver _l10n_gt_edi_claim_for_certification)
+                job._schedule_retry(error_doc.message or _("La factura la estaba certificando otro proceso."))
+
+    def _schedule_retry(self, error, final=False):
+        """Registra un intento fallido y programa el siguiente con espera exponencial."""
+        now = fields.Datetime.now()
+        for job in self:
+            attempts = job.attempts + 1
+            if final or attempts >= job.max_attempts:
+                job.write({'state': 'failed', 'attempts': attempts, 'last_error': error})
+                logging.error("FEL Cola: Factura %s falló definitivamente tras %s intentos: %s",
+                              job.move_id.name, attempts, error)
+                continue
+            delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+            job.write({
+                'state': 'pending',
+                'attempts': attempts,
+                'last_error': error,
+                'next_run_at': now + timedelta(seconds=delay),
+            })
+            logging.info("FEL Cola: Factura %s reintentará en %s segundos (intento %s)",
+                         job.move_id.name, delay, attempts)
+
+    # =========================================================================
+    # ACCIONES
+    # =========================================================================
+
+    def action_retry(self):
+        """Vuelve a poner en cola los trabajos fallidos de inmediato."""
+        self.filtered(lambda j: j.state in ('failed', 'pending')).write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_run_at': fields.Datetime.now(),
+        })
+        self.env.ref('adroc_l10n_gt_edi_adenda.ir_cron_l10n_gt_edi_certification_job')._trigger()
@@ -1,4 +1,4 @@
-from odoo import fields, models
+from odoo import fields, models, api
 
 
 class L10nGtEdiDocument(models.Model):
@@ -14,6 +14,48 @@ class L10nGtEdiDocument(models.Model):
             'invoice_cancelling_failed': 'cascade',
         }
     )
-    cancellation_uuid = fields.Char(string="Cancellation UUID")
+    cancellation_uuid = fields.Char(string="Cancellation UUID", index='btree_not_null')
     cancellation_date = fields.Datetime(string="Cancellation Date")
     cancellation_reason = fields.Char(string="Cancellation Reason")
+    # Identificador enviado a INFILE cuando el envío falló sin saber si se certificó
+    # (timeout, conexión cortada): se reenvía el mismo XML con este identificador y
+    # INFILE devuelve el DTE ya certificado (ver account.move._l10n_gt_edi_recover_in_flight)
+    identification_key = fields.Char(string="Identification Key", index='btree_not_null')
+
+    # Búsqueda del documento vigente de una factura (ver account.move.l10n_gt_edi_current_document_id)
+    _invoice_state_id_idx = models.Index('(invoice_id, state, id)')
+    # Búsqueda inversa por serie/número FEL (ver account.move._l10n_gt_edi_search_by_fel_numbers)
+    _series_serial_number_idx = models.Index('(series, serial_number) WHERE serial_number IS NOT NULL')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        documents = super().create(vals_list)
+        documents.invoice_id._l10n_gt_edi_refresh_current_document()
+        return documents
+
+    def write(self, vals):
+        invoices = self.invoice_id
+        res = super().write(vals)
+        if {'state', 'invoice_id'}.intersection(vals):
+            (invoices | self.invoice_id)._l10n_gt_edi_refresh_current_document()
+        return res
+
+    def unlink(self):
+        invoices = self.invoice_id
+        res = super().unlink()
+        invoices.exists()._l10n_gt_edi_refresh_current_document()
+        return res
+
+    def action_download_file(self):
+        """
+        Los XML se guardan tal como viajaron (compactos); la versión indentada se
+        genera solo al descargar (ver controllers/main.py).
+        """
+        self.ensure_one()
+        if not self.attachment_id or not (self.attachment_id.mimetype or '').endswith('xml'):
+            return super().action_download_file()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/l10n_gt_edi/document/{self.id}/xml',
+            'target': 'download',
+        }
@@ -0,0 +1,17 @@
+from odoo import models
+
+
+class L10nGtEdiPhrase(models.Model):
+    _inherit = 'l10n_gt_edi.phrase'
+
+    def unlink(self):
+        # La caché de res.company._l10n_gt_edi_get_static_fel_data solo guarda los ids de
+        # las frases de compañías y diarios: editar una frase no la afecta, borrarla sí
+        in_cache = bool(
+            self.env['res.company'].sudo().search_count([('l10n_gt_edi_phrase_ids', 'in', self.ids)], limit=1)
+            or self.env['account.journal'].sudo().search_count([('l10n_gt_edi_phrase_ids', 'in', self.ids)], limit=1)
+        )
+        res = super().unlink()
+        if in_cache:
+            self.env['res.company']._l10n_gt_edi_clear_static_cache()
+        return res
@@ -0,0 +1,117 @@
+import logging
+import time
+
+from odoo import fields, models, api, _
+
+# Tiempo máximo de espera por defecto cuando no quedan turnos (segundos)
+DEFAULT_RATE_LIMIT_MAX_WAIT = 10
+
+
+class L10nGtEdiRateBucket(models.Model):
+    """
+    Token bucket de peticiones a INFILE por compañía certificadora, compartido por
+    todos los procesos de Odoo a través de PostgreSQL.
+
+    Cada compañía tiene una fila con los turnos disponibles y la hora de la última
+    actualización. Los turnos se toman en una transacción propia y corta
+    (SELECT ... FOR UPDATE y commit inmediato), de modo que el bloqueo de la fila
+    no dura lo que dura la certificación.
+    """
+    _name = 'l10n_gt_edi.rate.bucket'
+    _description = 'Limitador de peticiones a INFILE'
+    _log_access = False
+
+    company_id = fields.Many2one('res.company', string="Compañía", required=True, ondelete='cascade')
+    tokens = fields.Float(string="Turnos Disponibles")
+    updated_at = fields.Datetime(string="Última Actualización")
+
+    _company_uniq = models.Constraint('UNIQUE(company_id)', "Solo puede haber un limitador por compañía.")
+
+    @api.model
+    def _acquire(self, company_id, limits, requested):
+        """
+        Toma hasta `requested` turnos del bucket de la compañía. Si no hay ninguno,
+        espera a que se repongan hasta limits['max_wait'] segundos.
+
+        Args:
+            limits (dict): 'rate' (peticiones por segundo), 'burst', 'max_wait'.
+
+        Returns:
+            int: turnos concedidos (0 si se agotó la espera).
+        """
+        rate, burst = limits['rate'], max(1, limits['burst'])
+        deadline = time.monotonic() + limits['max_wait']
+        while True:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO l10n_gt_edi_rate_bucket (company_id, tokens, updated_at)
+                    VALUES (%s, %s, clock_timestamp() AT TIME ZONE 'UTC')
+                    ON CONFLICT (company_id) DO NOTHING
+                """, [company_id, burst])
+                cr.execute("""
+                    SELECT tokens, EXTRACT(EPOCH FROM (clock_timestamp() AT TIME ZONE 'UTC') - updated_at)
+                      FROM l10n_gt_edi_rate_bucket
+                     WHERE company_id = %s
+                       FOR UPDATE
+                """, [company_id])
+                tokens, elapsed = cr.fetchone()
+                tokens = min(burst, (tokens or 0.0) + max(0.0, float(elapsed or 0.0)) * rate)
+                granted = min(requested, int(tokens))
+                cr.execute("""
+                    UPDATE l10n_gt_edi_rate_bucket
+                       SET tokens = %s, updated_at = clock_timestamp() AT TIME ZONE 'UTC'
+                     WHERE company_id = %s
+                """, [tokens - granted, company_id])
+            if granted:
+                return granted
+            wait = (1 - tokens) / rate
+            if time.monotonic() + wait > deadline:
+                return 0
+            time.sleep(wait)
+
+    @api.model
+    def _run_rate_limited(self, payloads, runner):
+        """
+        Ejecuta runner(lista_de_payloads) respetando el límite de peticiones de la
+        compañía certificadora de cada payload: envía por tandas según los turnos
+        disponibles y espera entre tandas en lugar de rechazar.
+
+        Los payloads que no consiguen turno dentro de la espera máxima reciben
+        {'errors': [...], 'rate_limited': True} (no se envían a INFILE).
+
+        Returns:
+            list: resultados en el mismo orden que payloads.
+        """
+        results = [None] * len(payloads)
+        unlimited = []
+        limited = {}
+        for index, payload in enumerate(payloads):
+            credentials = payload['credentials']
+            limits = credentials.get('rate_limit')
+            if credentials['service_provider'] == 'demo' or not limits or limits['rate'] <= 0:
+                unlimited.append(index)
+            else:
+                limited.setdefault(credentials['company_id'], []).append(index)
+
+        def run(indexes):
+            for index, result in zip(indexes, runner([payloads[i] for i in indexes])):
+                results[index] = result
+
+        if unlimited:
+            run(unlimited)
+        for company_id, indexes in limited.items():
+            limits = payloads[indexes[0]]['credentials']['rate_limit']
+            while indexes:
+                granted = self._acquire(company_id, limits, len(indexes))
+                if not granted:
+                    logging.warning("FEL Límite: Compañía %s sin turnos tras %ss de espera, %s envíos diferidos",
+                                    company_id, limits['max_wait'], len(indexes))
+                    for index in indexes:
+                        results[index] = {
+                            'errors': [_("Límite de peticiones a INFILE alcanzado, se reintentará más tarde.")],
+                            'rate_limited': True,
+                        }
+                    break
+                run(indexes[:granted])
+                indexes = indexes[granted:]
+        return results
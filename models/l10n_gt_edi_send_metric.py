@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from odoo import fields, models, api
+
+# Días que se conservan las métricas de envío
+METRICS_RETENTION_DAYS = 90
+
+
+class L10nGtEdiSendMetric(models.Model):
+    _name = 'l10n_gt_edi.send.metric'
+    _description = 'Métricas de tiempo de certificación FEL'
+    _order = 'id desc'
+    _rec_name = 'move_id'
+
+    move_id = fields.Many2one('account.move', string="Factura", index='btree_not_null', ondelete='set null')
+    company_id = fields.Many2one('res.company', string="Compañía", required=True, index=True)
+    journal_id = fields.Many2one('account.journal', string="Diario", index=True)
+    success = fields.Boolean(string="Certificada")
+
+    # Duración de cada etapa de _l10n_gt_edi_try_send, en milisegundos
+    validation_ms = fields.Float(string="Validación (ms)", aggregator='avg')
+    values_ms = fields.Float(string="Valores (ms)", aggregator='avg')
+    render_ms = fields.Float(string="Render QWeb (ms)", aggregator='avg')
+    transform_ms = fields.Float(string="Transformaciones XML (ms)", aggregator='avg')
+    serialize_ms = fields.Float(string="Serialización (ms)", aggregator='avg')
+    http_ms = fields.Float(string="INFILE HTTP (ms)", aggregator='avg')
+    document_ms = fields.Float(string="Documento/Adjunto (ms)", aggregator='avg')
+    total_ms = fields.Float(string="Total (ms)", compute='_compute_total_ms', store=True, aggregator='avg')
+    stage_timings = fields.Json(string="Detalle por etapa")
+
+    @api.depends('validation_ms', 'values_ms', 'render_ms', 'transform_ms', 'serialize_ms', 'http_ms', 'document_ms')
+    def _compute_total_ms(self):
+        for metric in self:
+            metric.total_ms = (
+                metric.validation_ms + metric.values_ms + metric.render_ms + metric.transform_ms
+                + metric.serialize_ms + metric.http_ms + metric.document_ms
+            )
+
+    @api.model
+    def _record(self, vals_list):
+        """Guarda las métricas en un solo INSERT. Acepta un dict, una lista, o None (sin métricas)."""
+        if isinstance(vals_list, dict):
+            vals_list = [vals_list]
+        vals_list = [vals for vals in vals_list or [] if vals]
+        if vals_list:
+            return self.sudo().create(vals_list)
+        return self.browse()
+
+    @api.autovacuum
+    def _gc_old_metrics(self):
+        limit_date = fields.Datetime.now() - timedelta(days=METRICS_RETENTION_DAYS)
+        self.sudo().search([('create_date', '<', limit_date)]).unlink()
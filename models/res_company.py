@@ -0,0 +1,235 @@
+from odoo import fields, models, api, tools
+
+from .account_move import DEFAULT_COMMIT_EVERY
+from .l10n_gt_edi_rate_bucket import DEFAULT_RATE_LIMIT_MAX_WAIT
+from .utils import (
+    _l10n_gt_edi_close_infile_sessions,
+    _l10n_gt_edi_get_circuit_breaker_snapshot,
+    _l10n_gt_edi_get_infile_credentials,
+    _l10n_gt_edi_reset_circuit_breakers,
+    DEFAULT_BREAKER_CONFIG,
+    DEFAULT_HTTP_POOL_SIZE,
+    TIMEOUT_PERCENTILE,
+)
+
+# Campos que invalidan la sesión HTTP de la compañía certificadora
+INFILE_SESSION_FIELDS = {
+    'l10n_gt_edi_service_provider',
+    'l10n_gt_edi_ws_prefix',
+    'l10n_gt_edi_infile_token',
+    'l10n_gt_edi_infile_key',
+    'l10n_gt_edi_http_pool_size',
+}
+
+# Configuración del circuit breaker (viaja en las credenciales en caché)
+INFILE_BREAKER_FIELDS = {
+    'l10n_gt_edi_breaker_error_threshold',
+    'l10n_gt_edi_breaker_min_calls',
+    'l10n_gt_edi_breaker_open_seconds',
+    'l10n_gt_edi_timeout_min',
+    'l10n_gt_edi_timeout_max',
+    'l10n_gt_edi_breaker_reset_at',
+}
+
+# Límite de peticiones compartido entre procesos (viaja en las credenciales en caché)
+INFILE_RATE_LIMIT_FIELDS = {
+    'l10n_gt_edi_rate_limit',
+    'l10n_gt_edi_rate_burst',
+    'l10n_gt_edi_rate_max_wait',
+}
+
+# Campos de compañía que invalidan los datos FEL estáticos en caché
+FEL_STATIC_COMPANY_FIELDS = INFILE_SESSION_FIELDS | INFILE_BREAKER_FIELDS | INFILE_RATE_LIMIT_FIELDS | {
+    'name',
+    'parent_id',
+    'partner_id',
+    'l10n_gt_edi_phrase_ids',
+}
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    l10n_gt_edi_http_pool_size = fields.Integer(
+        string="Conexiones HTTP a INFILE",
+        default=DEFAULT_HTTP_POOL_SIZE,
+        help="Número máximo de conexiones keep-alive hacia INFILE por proceso de Odoo. "
+             "Se usa en la compañía certificadora (raíz) para certificación y anulación.",
+    )
+
+    l10n_gt_edi_collect_metrics = fields.Boolean(
+        string="Registrar Métricas de Certificación",
+        default=True,
+        help="Guarda el tiempo de cada etapa de la certificación FEL "
+             "(validación, XML, INFILE, documento) para analizar el rendimiento.",
+    )
+
+    l10n_gt_edi_commit_policy = fields.Selection(
+        selection=[
+            ('invoice', "Por factura"),
+            ('every_n', "Cada N facturas"),
+            ('batch', "Por lote"),
+        ],
+        string="Confirmación en Certificación Masiva",
+        default='invoice',
+        required=True,
+        help="Cuándo se confirma la transacción al certificar varias facturas:\n"
+             "- Por factura: después de cada factura certificada.\n"
+             "- Cada N facturas: cada N facturas procesadas.\n"
+             "- Por lote: una sola vez al final del lote.\n"
+             "En todos los casos un error en una factura solo deshace esa factura.",
+    )
+    l10n_gt_edi_commit_every = fields.Integer(
+        string="Facturas por Confirmación",
+        default=DEFAULT_COMMIT_EVERY,
+    )
+
+    # =========================================================================
+    # CIRCUIT BREAKER Y TIMEOUT ADAPTATIVO (compañía certificadora)
+    # =========================================================================
+
+    l10n_gt_edi_breaker_error_threshold = fields.Integer(
+        string="Umbral de Errores INFILE (%)",
+        default=DEFAULT_BREAKER_CONFIG['error_threshold'],
+        help="Porcentaje de llamadas fallidas (timeout, conexión, error 5xx o 429) entre las "
+             "recientes que abre el circuito: mientras está abierto no se llama a INFILE y "
+             "las facturas se envían a la cola de certificación.",
+    )
+    l10n_gt_edi_breaker_min_calls = fields.Integer(
+        string="Llamadas Mínimas para Evaluar",
+        default=DEFAULT_BREAKER_CONFIG['min_calls'],
+        help="Número de llamadas recientes necesarias antes de evaluar el umbral de errores "
+             "y de calcular el timeout adaptativo.",
+    )
+    l10n_gt_edi_breaker_open_seconds = fields.Integer(
+        string="Tiempo con Circuito Abierto (s)",
+        default=DEFAULT_BREAKER_CONFIG['open_seconds'],
+        help="Segundos sin llamar a INFILE tras abrir el circuito; después se deja pasar "
+             "una llamada de prueba.",
+    )
+    l10n_gt_edi_timeout_min = fields.Integer(
+        string="Timeout Mínimo INFILE (s)",
+        default=DEFAULT_BREAKER_CONFIG['timeout_min'],
+    )
+    l10n_gt_edi_timeout_max = fields.Integer(
+        string="Timeout Máximo INFILE (s)",
+        default=DEFAULT_BREAKER_CONFIG['timeout_max'],
+        help="El timeout de cada llamada se ajusta a la latencia observada "
+             "(percentil de las llamadas exitosas recientes) dentro de este rango.",
+    )
+    l10n_gt_edi_breaker_state = fields.Selection(
+        selection=[
+            ('closed', "Cerrado"),
+            ('open', "Abierto"),
+            ('half_open', "En prueba"),
+        ],
+        string="Estado del Circuito INFILE (este proceso)",
+        compute='_compute_l10n_gt_edi_breaker_state',
+        help="Cada proceso (worker) de Odoo lleva su propio circuito: se muestra el del "
+             "proceso que atiende esta vista, los demás pueden estar en otro estado.",
+    )
+    l10n_gt_edi_breaker_opened_at = fields.Datetime(
+        string="Circuito Abierto Desde (este proceso)",
+        compute='_compute_l10n_gt_edi_breaker_state',
+    )
+    l10n_gt_edi_breaker_error_rate = fields.Float(
+        string="Errores Recientes (%) (este proceso)",
+        compute='_compute_l10n_gt_edi_breaker_state',
+    )
+    l10n_gt_edi_breaker_latency_ms = fields.Float(
+        string=f"Latencia p{TIMEOUT_PERCENTILE} (ms) (este proceso)",
+        compute='_compute_l10n_gt_edi_breaker_state',
+    )
+    l10n_gt_edi_breaker_reset_at = fields.Datetime(
+        string="Último Cierre Manual del Circuito",
+        readonly=True,
+        copy=False,
+        help="Al cambiar, todos los procesos de Odoo cierran su circuito antes de la siguiente llamada a INFILE.",
+    )
+
+    # =========================================================================
+    # LÍMITE DE PETICIONES A INFILE (compañía certificadora, todos los procesos)
+    # =========================================================================
+
+    l10n_gt_edi_rate_limit = fields.Float(
+        string="Peticiones por Segundo a INFILE",
+        help="Máximo de peticiones por segundo a INFILE entre todos los procesos de Odoo "
+             "(certificación y anulación). 0 = sin límite.",
+    )
+    l10n_gt_edi_rate_burst = fields.Integer(
+        string="Ráfaga Máxima",
+        help="Peticiones que se pueden enviar de golpe tras un periodo sin tráfico. "
+             "Si se deja en 0 se usa el límite por segundo.",
+    )
+    l10n_gt_edi_rate_max_wait = fields.Integer(
+        string="Espera Máxima por Turno (s)",
+        default=DEFAULT_RATE_LIMIT_MAX_WAIT,
+        help="Segundos que se espera un turno cuando se alcanzó el límite. Pasado este tiempo "
+             "las certificaciones se envían a la cola y las anulaciones se rechazan para "
+             "reintentarlas más tarde.",
+    )
+
+    def _compute_l10n_gt_edi_breaker_state(self):
+        for company in self:
+            snapshot = _l10n_gt_edi_get_circuit_breaker_snapshot(self.env.cr.dbname, company.id) or {}
+            company.l10n_gt_edi_breaker_state = snapshot.get('state', 'closed')
+            company.l10n_gt_edi_breaker_opened_at = snapshot.get('opened_at')
+            company.l10n_gt_edi_breaker_error_rate = snapshot.get('error_rate', 0.0)
+            company.l10n_gt_edi_breaker_latency_ms = snapshot.get('latency_percentile_ms', 0.0)
+
+    def action_l10n_gt_edi_reset_breaker(self):
+        """
+        Cierra el circuito de INFILE en todos los procesos: en este de inmediato y en
+        los demás al detectar el nuevo l10n_gt_edi_breaker_reset_at en las credenciales
+        (la escritura invalida la caché del registro en todos los workers).
+        """
+        self.sudo().l10n_gt_edi_breaker_reset_at = fields.Datetime.now()
+        _l10n_gt_edi_reset_circuit_breakers(self.env.cr.dbname, set(self.ids))
+
+    def write(self, vals):
+        res = super().write(vals)
+        if INFILE_SESSION_FIELDS.intersection(vals):
+            # Cerrar la sesión de este proceso; los demás la renuevan al detectar el cambio
+            _l10n_gt_edi_close_infile_sessions(self.env.cr.dbname, set(self.ids))
+        if FEL_STATIC_COMPANY_FIELDS.intersection(vals):
+            self._l10n_gt_edi_clear_static_cache()
+        return res
+
+    # =========================================================================
+    # DATOS FEL ESTÁTICOS POR COMPAÑÍA/DIARIO (CACHÉ)
+    # =========================================================================
+
+    def _l10n_gt_edi_get_certifying_company(self):
+        """Compañía que certifica ante INFILE: el último padre con NIT o la compañía raíz."""
+        self.ensure_one()
+        company = self.sudo()
+        return company.parent_ids.filtered('partner_id.vat')[-1:] or company.root_id
+
+    @api.model
+    @tools.ormcache('company_id', 'journal_id')
+    def _l10n_gt_edi_get_static_fel_data(self, company_id, journal_id):
+        """
+        Datos FEL que solo cambian al reconfigurar compañía, diario o frases:
+        compañía certificadora, credenciales de INFILE, datos del exportador y
+        frases de compañía/diario. Se guardan en caché por (compañía, diario).
+
+        No modificar el resultado: es compartido. Usar
+        account.move._l10n_gt_edi_get_static_fel_data() que devuelve una copia.
+        """
+        company = self.sudo().browse(company_id)
+        certifying_company = company._l10n_gt_edi_get_certifying_company()
+        journal = self.env['account.journal'].sudo().browse(journal_id)
+        return {
+            'certifying_company_id': certifying_company.id,
+            'credentials': _l10n_gt_edi_get_infile_credentials(certifying_company),
+            'exportador_name': (company.name or company.partner_id.name or '')[:70],
+            'company_phrase_ids': tuple(company.l10n_gt_edi_phrase_ids.ids),
+            'journal_phrase_ids': (
+                tuple(journal.l10n_gt_edi_phrase_ids.ids)
+                if journal.l10n_gt_edi_use_journal_phrases else ()
+            ),
+        }
+
+    @api.model
+    def _l10n_gt_edi_clear_static_cache(self):
+        self.env.registry.clear_cache()
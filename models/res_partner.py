@@ -0,0 +1,15 @@
+from odoo import models
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    def write(self, vals):
+        # Solo los partners de compañías afectan la caché: el nombre (exportador) y si
+        # tienen NIT (compañía certificadora, ver res.company._l10n_gt_edi_get_certifying_company)
+        company_partners = self.sudo().filtered('ref_company_ids') if {'name', 'vat'}.intersection(vals) else self.browse()
+        before = {partner.id: (partner.name, bool(partner.vat)) for partner in company_partners}
+        res = super().write(vals)
+        if any(before[partner.id] != (partner.name, bool(partner.vat)) for partner in company_partners):
+            self.env['res.company']._l10n_gt_edi_clear_static_cache()
+        return res
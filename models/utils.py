@@ -0,0 +1,495 @@
+import base64
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from json import JSONDecodeError
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+INFILE_CERTIFICATION_URL = "https://certificador.feel.com.gt/fel/procesounificado/transaccion/v2/xml"
+
+# Conexiones keep-alive por compañía certificadora (por proceso)
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60
+
+# Registro de sesiones HTTP: {(dbname, company_id): (huella_credenciales, requests.Session)}
+_infile_sessions = {}
+_infile_sessions_lock = threading.Lock()
+
+# Circuit breaker por compañía certificadora: configuración por defecto
+# (se sobrescribe con los campos de la compañía, ver _l10n_gt_edi_get_infile_credentials)
+DEFAULT_BREAKER_CONFIG = {
+    'error_threshold': 50,  # % de llamadas fallidas en la ventana que abre el circuito
+    'min_calls': 10,  # llamadas mínimas en la ventana antes de evaluar el umbral
+    'open_seconds': 60,  # tiempo abierto antes de dejar pasar una llamada de prueba
+    'timeout_min': 10,  # segundos
+    'timeout_max': DEFAULT_TIMEOUT,  # segundos
+}
+# Últimas llamadas consideradas para la tasa de errores y los percentiles de latencia
+BREAKER_WINDOW_SIZE = 50
+# Timeout adaptativo: percentil de latencia observado multiplicado por un margen
+TIMEOUT_PERCENTILE = 95
+TIMEOUT_FACTOR = 3
+
+# Registro de circuit breakers: {(dbname, company_id): _InfileCircuitBreaker}
+_infile_breakers = {}
+_infile_breakers_lock = threading.Lock()
+
+
+# =========================================================================
+# SESIONES HTTP CON POOL DE CONEXIONES
+# =========================================================================
+
+def _l10n_gt_edi_get_infile_credentials(company):
+    """
+    Copia en un dict las credenciales de la compañía certificadora (raíz).
+    El dict no depende del cursor, por lo que se puede usar desde otros hilos.
+    """
+    return {
+        'dbname': company.env.cr.dbname,
+        # Permite apuntar a otro servidor (p.ej. tools/infile_stub_server.py) para pruebas de carga
+        'url': company.env['ir.config_parameter'].sudo().get_param('l10n_gt_edi.infile_url') or INFILE_CERTIFICATION_URL,
+        'company_id': company.id,
+        'service_provider': company.l10n_gt_edi_service_provider,
+        'ws_prefix': company.l10n_gt_edi_ws_prefix,
+        'infile_token': company.l10n_gt_edi_infile_token,
+        'infile_key': company.l10n_gt_edi_infile_key,
+        'pool_size': company.l10n_gt_edi_http_pool_size or DEFAULT_HTTP_POOL_SIZE,
+        'breaker': {
+            'error_threshold': company.l10n_gt_edi_breaker_error_threshold or DEFAULT_BREAKER_CONFIG['error_threshold'],
+            'min_calls': company.l10n_gt_edi_breaker_min_calls or DEFAULT_BREAKER_CONFIG['min_calls'],
+            'open_seconds': company.l10n_gt_edi_breaker_open_seconds or DEFAULT_BREAKER_CONFIG['open_seconds'],
+            'timeout_min': company.l10n_gt_edi_timeout_min or DEFAULT_BREAKER_CONFIG['timeout_min'],
+            'timeout_max': company.l10n_gt_edi_timeout_max or DEFAULT_BREAKER_CONFIG['timeout_max'],
+            # Cambia con "Cerrar Circuito": cada proceso cierra su circuito al detectarlo
+            'reset_at': company.l10n_gt_edi_breaker_reset_at and company.l10n_gt_edi_breaker_reset_at.isoformat(),
+        },
+        # Límite de peticiones compartido entre procesos (ver l10n_gt_edi.rate.bucket)
+        'rate_limit': {
+            'rate': company.l10n_gt_edi_rate_limit,
+            'burst': company.l10n_gt_edi_rate_burst or max(1, math.ceil(company.l10n_gt_edi_rate_limit)),
+            'max_wait': company.l10n_gt_edi_rate_max_wait,
+        },
+    }
+
+
+def _l10n_gt_edi_credentials_fingerprint(credentials):
+    raw = '|'.join(str(credentials[key]) for key in ('ws_prefix', 'infile_token', 'infile_key', 'pool_size'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _l10n_gt_edi_get_infile_session(credentials):
+    """
+    Devuelve la sesión HTTP de la compañía certificadora, creándola si hace falta.
+    Si las credenciales o el tamaño del pool cambiaron, la sesión anterior se cierra.
+    """
+    key = (credentials['dbname'], credentials['company_id'])
+    fingerprint = _l10n_gt_edi_credentials_fingerprint(credentials)
+    with _infile_sessions_lock:
+        entry = _infile_sessions.get(key)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+        if entry:
+            entry[1].close()
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=credentials['pool_size'])
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _infile_sessions[key] = (fingerprint, session)
+        logging.info("FEL HTTP: Nueva sesión para compañía %s (pool de %s conexiones)",
+                     credentials['company_id'], credentials['pool_size'])
+        return session
+
+
+def _l10n_gt_edi_close_infile_sessions(dbname, company_ids=None):
+    """Cierra las sesiones de las compañías indicadas (todas las de la base si no se indican)."""
+    with _infile_sessions_lock:
+        for key in list(_infile_sessions):
+            if key[0] == dbname and (company_ids is None or key[1] in company_ids):
+                _infile_sessions.pop(key)[1].close()
+
+
+# =========================================================================
+# CIRCUIT BREAKER Y TIMEOUT ADAPTATIVO
+# =========================================================================
+
+class InfileCircuitOpenError(Exception):
+    """El circuito de la compañía certificadora está abierto: INFILE no se llama."""
+
+    def __init__(self, company_id):
+        super().__init__(f"INFILE no disponible para la compañía {company_id}: circuito abierto temporalmente")
+        self.company_id = company_id
+
+
+class _InfileCircuitBreaker:
+    """
+    Circuit breaker de las llamadas a INFILE de una compañía certificadora (por proceso).
+
+    - closed: las llamadas pasan; se registra latencia y resultado de las últimas
+      BREAKER_WINDOW_SIZE. Si la tasa de errores supera el umbral, se abre.
+    - open: las llamadas fallan de inmediato durante open_seconds.
+    - half_open: pasa una sola llamada de prueba; si funciona se cierra, si no se reabre.
+
+    Solo cuentan como error las fallas de infraestructura (timeout, conexión, 5xx, 429),
+    no los rechazos de validación del SAT.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.config = dict(DEFAULT_BREAKER_CONFIG)
+        self.calls = deque(maxlen=BREAKER_WINDOW_SIZE)  # (éxito, latencia en ms)
+        self.state = 'closed'
+        self.opened_at = None  # time.monotonic()
+        self.opened_at_utc = None
+        self.trial_running = False
+        self.reset_at = None  # último cierre manual aplicado (l10n_gt_edi_breaker_reset_at)
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Indica si se puede llamar a INFILE ahora."""
+        with self.lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.config['open_seconds']:
+                    return False
+                self.state = 'half_open'
+                self.trial_running = False
+            if self.state == 'half_open':
+                if self.trial_running:
+                    return False
+                self.trial_running = True
+            return True
+
+    def record(self, success, latency_ms):
+        with self.lock:
+            self.calls.append((success, latency_ms))
+            if self.state == 'half_open':
+                self.trial_running = False
+                if success:
+                    self.state = 'closed'
+                    self.calls.clear()
+                    logging.info("FEL Circuito: Compañía %s - circuito cerrado, INFILE responde", self.company_id)
+                else:
+                    self._open()
+            elif self.state == 'closed' and not success:
+                if len(self.calls) >= self.config['min_calls'] and self._error_rate() >= self.config['error_threshold']:
+                    self._open()
+
+    def reset(self):
+        with self.lock:
+            self.state = 'closed'
+            self.calls.clear()
+            self.trial_running = False
+
+    def timeout(self):
+        """Timeout (s) según el percentil de latencia de las llamadas exitosas recientes."""
+        with self.lock:
+            percentile = self._latency_percentile()
+        if percentile is None:
+            return self.config['timeout_max']
+        timeout = percentile * TIMEOUT_FACTOR / 1000
+        return max(self.config['timeout_min'], min(self.config['timeout_max'], timeout))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'opened_at': self.opened_at_utc if self.state != 'closed' else None,
+                'calls': len(self.calls),
+                'error_rate': self._error_rate(),
+                'latency_percentile_ms': self._latency_percentile() or 0.0,
+            }
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.opened_at_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        logging.warning(
+            "FEL Circuito: Compañía %s - circuito abierto por %ss (%.0f%% de errores en %s llamadas)",
+            self.company_id, self.config['open_seconds'], self._error_rate(), len(self.calls),
+        )
+
+    def _error_rate(self):
+        if not self.calls:
+            return 0.0
+        return 100.0 * sum(1 for success, _latency in self.calls if not success) / len(self.calls)
+
+    def _latency_percentile(self):
+        latencies = sorted(latency for success, latency in self.calls if success)
+        if len(latencies) < self.config['min_calls']:
+            return None
+        return latencies[math.ceil(TIMEOUT_PERCENTILE / 100 * len(latencies)) - 1]
+
+
+def _l10n_gt_edi_get_circuit_breaker(credentials):
+    """Circuit breaker de la compañía certificadora, con la configuración actual de la compañía."""
+    key = (credentials['dbname'], credentials['company_id'])
+    with _infile_breakers_lock:
+        breaker = _infile_breakers.get(key)
+        if not breaker:
+            breaker = _infile_breakers[key] = _InfileCircuitBreaker(credentials['company_id'])
+    config = {**DEFAULT_BREAKER_CONFIG, **credentials.get('breaker', {})}
+    reset_at = config.pop('reset_at', None)
+    if reset_at != breaker.reset_at:
+        # Cierre manual desde otro proceso (llega con la invalidación de la caché del registro)
+        breaker.reset()
+        breaker.reset_at = reset_at
+    breaker.config = config
+    return breaker
+
+
+def _l10n_gt_edi_get_circuit_breaker_snapshot(dbname, company_id):
+    """Estado del circuit breaker de la compañía en este proceso (o None si no ha llamado a INFILE)."""
+    with _infile_breakers_lock:
+        breaker = _infile_breakers.get((dbname, company_id))
+    return breaker and breaker.snapshot()
+
+
+def _l10n_gt_edi_reset_circuit_breakers(dbname, company_ids):
+    with _infile_breakers_lock:
+        breakers = [b for key, b in _infile_breakers.items() if key[0] == dbname and key[1] in company_ids]
+    for breaker in breakers:
+        breaker.reset()
+
+
+def _l10n_gt_edi_is_breaker_failure(error):
+    """Fallas de infraestructura que cuentan para el circuit breaker."""
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+
+# =========================================================================
+# LLAMADAS A INFILE
+# =========================================================================
+
+def _l10n_gt_edi_infile_request(credentials, method, url, headers, data=None, timeout=None):
+    """
+    Hace una petición a INFILE con la sesión de la compañía certificadora, a través
+    de su circuit breaker. Sin timeout explícito se usa el timeout adaptativo.
+
+    Returns:
+        requests.Response
+
+    Raises:
+        InfileCircuitOpenError: si el circuito está abierto (sin hacer la petición).
+        requests.RequestException: errores de red o HTTP (ya registrados en el breaker).
+    """
+    breaker = _l10n_gt_edi_get_circuit_breaker(credentials)
+    if not breaker.allow():
+        raise InfileCircuitOpenError(credentials['company_id'])
+
+    start = time.perf_counter()
+    try:
+        session = _l10n_gt_edi_get_infile_session(credentials)
+        response = session.request(
+            method, url, headers=headers, data=data, timeout=timeout or breaker.timeout(),
+        )
+        if response.status_code != 404:
+            response.raise_for_status()
+    except requests.RequestException as e:
+        breaker.record(not _l10n_gt_edi_is_breaker_failure(e), (time.perf_counter() - start) * 1000)
+        raise
+    except Exception:
+        # Cualquier otro error (urllib3, ValueError...) también se registra: si no, la
+        # llamada de prueba en half_open quedaría en curso y el circuito no volvería a abrir paso
+        breaker.record(False, (time.perf_counter() - start) * 1000)
+        raise
+    breaker.record(True, (time.perf_counter() - start) * 1000)
+    return response
+
+
+def _l10n_gt_edi_infile_post(credentials, url, xml_data, identification_key, timeout=None):
+    """
+    Envía un XML a INFILE usando la sesión de la compañía certificadora.
+
+    Returns:
+        dict: respuesta JSON de INFILE, o {'errors': [...]} si no se pudo obtener.
+              'in_flight' indica que INFILE pudo haberla procesado y 'circuit_open'
+              que no se envió porque el circuito está abierto.
+    """
+    try:
+        response = _l10n_gt_edi_infile_request(
+            credentials,
+            'POST',
+            url,
+            headers={
+                'UsuarioFirma': credentials['ws_prefix'],
+                'LlaveFirma': credentials['infile_token'],
+                'UsuarioApi': credentials['ws_prefix'],
+                'LlaveApi': credentials['infile_key'],
+                'identificador': identification_key,
+            },
+            data=xml_data.encode('utf-8') if isinstance(xml_data, str) else xml_data,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+    except InfileCircuitOpenError as e:
+        logging.warning("FEL HTTP: %s", e)
+        return {'errors': [str(e)], 'circuit_open': True}
+    except JSONDecodeError as e:
+        logging.error("FEL HTTP: Error decodificando respuesta JSON: %s", e)
+        return {'errors': [f"Error en respuesta de INFILE: {str(e)}"], 'in_flight': True}
+    except requests.RequestException as e:
+        logging.error("FEL HTTP: Error de conexión: %s", e)
+        return {'errors': [f"Error de conexión con INFILE: {str(e)}"], 'in_flight': _l10n_gt_edi_is_in_flight_error(e)}
+
+
+def _l10n_gt_edi_is_in_flight_error(error):
+    """
+    Indica si INFILE pudo haber procesado la petición aunque no obtuvimos respuesta
+    (timeout, conexión cortada, error 5xx). Los 4xx (credenciales, límite de
+    peticiones) garantizan que el documento no se certificó.
+    """
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+def _l10n_gt_edi_infile_certify(credentials, xml_data, identification_key):
+    """
+    Certifica un DTE en INFILE.
+
+    Returns:
+        dict: mismo formato que l10n_gt_edi.models.utils._l10n_gt_edi_send_to_sat
+              ('uuid', 'series', 'serial_number', 'certification_date', 'xml')
+              o {'errors': [...]}.
+    """
+    result = _l10n_gt_edi_infile_post(credentials, credentials['url'], xml_data, identification_key)
+    if 'errors' in result:
+        return result
+    return _l10n_gt_edi_parse_certification_response(result)
+
+
+def _l10n_gt_edi_infile_cancel(credentials, xml_data, identification_key):
+    """
+    Envía un XML de anulación (GTAnulacionDocumento) a INFILE.
+    En modo DEMO simula una respuesta exitosa sin hacer la petición.
+
+    Returns:
+        dict: respuesta JSON de INFILE o {'errors': [...]}.
+    """
+    if credentials['service_provider'] == 'demo':
+        logging.info("FEL Anulación: Modo DEMO - simulando respuesta exitosa")
+        return {
+            'resultado': True,
+            'uuid': 'DEMO-CANCEL-' + datetime.now().strftime('%Y%m%d%H%M%S'),
+            'descripcion': 'Anulación exitosa en modo DEMO',
+        }
+
+    try:
+        result = _l10n_gt_edi_infile_post(credentials, credentials['url'], xml_data, identification_key)
+        logging.info("FEL Anulación: Respuesta de INFILE: %s", result)
+        return result
+    except Exception as e:
+        logging.error("FEL Anulación: Error inesperado: %s", e)
+        return {'errors': [str(e)]}
+
+
+def _l10n_gt_edi_parse_certification_response(result):
+    """
+    Convierte la respuesta JSON de certificación de INFILE al formato de l10n_gt_edi.
+
+    Replica el análisis de la respuesta que hace _l10n_gt_edi_send_to_sat de
+    l10n_gt_edi 19.0 (models/utils.py), que no está separado de la petición HTTP y
+    no se puede reutilizar. El modo DEMO sigue pasando por el módulo base: hay que
+    mantener ambos sincronizados a mano al actualizar l10n_gt_edi.
+    """
+    if not result.get('resultado'):
+        errors = [
+            error.get('mensaje_error', str(error))
+            for error in result.get('descripcion_errores') or []
+        ]
+        return {'errors': errors or [result.get('descripcion') or "Error desconocido de INFILE"]}
+
+    certification_date = datetime.now(timezone.utc)
+    if result.get('fecha'):
+        try:
+            certification_date = datetime.fromisoformat(result['fecha'])
+        except ValueError:
+            logging.warning("FEL HTTP: Fecha de certificación con formato inesperado: %s", result['fecha'])
+
+    return {
+        'uuid': result['uuid'],
+        'series': result['serie'],
+        'serial_number': result['numero'],
+        'certification_date': certification_date.astimezone(timezone.utc).replace(tzinfo=None),
+        'xml': base64.b64decode(result['xml_certificado']) if result.get('xml_certificado') else b'',
+    }
+
+
+# =========================================================================
+# SERIALIZACIÓN DEL XML
+# =========================================================================
+
+def _l10n_gt_edi_serialize_compact(root):
+    """
+    Serializa el árbol una sola vez a bytes UTF-8 sin indentación, listo para enviar.
+    Quita los espacios en blanco entre elementos (la indentación de la plantilla);
+    el texto de los elementos hoja no se toca.
+    """
+    for element in root.iter():
+        if len(element) and element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+    return etree.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+
+def _l10n_gt_edi_pretty_xml(content):
+    """Versión indentada de un XML (bytes) para descargar; si no se puede leer lo devuelve igual."""
+    try:
+        root = etree.fromstring(content, etree.XMLParser(remove_blank_text=True))
+    except etree.XMLSyntaxError:
+        return content
+    return etree.tostring(root, pretty_print=True, encoding='UTF-8', xml_declaration=True)
+
+
+# =========================================================================
+# ENVÍO CONCURRENTE
+# =========================================================================
+
+def _l10n_gt_edi_run_in_pool(func, items, max_workers):
+    """
+    Ejecuta func(item) para cada elemento en un pool de hilos acotado.
+
+    func no debe usar el cursor del hilo principal: los cursores de Odoo no son
+    thread-safe. Cualquier excepción se registra y se devuelve como {'errors': [...]}
+    para no interrumpir el resto del lote.
+
+    Returns:
+        list: resultados en el mismo orden que items.
+    """
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            logging.exception("FEL Lote: Error inesperado en hilo de envío")
+            return {'errors': [str(e)]}
+
+    workers = max(1, min(int(max_workers), len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='l10n_gt_edi') as executor:
+        return list(executor.map(call, items))
+
+
+# =========================================================================
+# MÉTRICAS
+# =========================================================================
+
+@contextmanager
+def _l10n_gt_edi_timer(timings, stage):
+    """Acumula en timings[stage] la duración del bloque, en milisegundos."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
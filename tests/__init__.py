@@ -0,0 +1,7 @@
+from . import test_fel_benchmark
+from . import test_infile_response
+from . import test_circuit_breaker
+from . import test_rate_bucket
+from . import test_commit_policy
+from . import test_claim
+from . import test_serialize_compact
@@ -0,0 +1,128 @@
+from unittest.mock import MagicMock, patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.adroc_l10n_gt_edi_adenda.models import utils
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.utils import (
+    _l10n_gt_edi_get_circuit_breaker,
+    _l10n_gt_edi_infile_request,
+    InfileCircuitOpenError,
+    TIMEOUT_FACTOR,
+)
+
+BREAKER_CONFIG = {
+    'error_threshold': 50,
+    'min_calls': 4,
+    'open_seconds': 30,
+    'timeout_min': 2,
+    'timeout_max': 20,
+}
+
+
+@tagged('post_install', '-at_install')
+class TestCircuitBreaker(TransactionCase):
+    """Estados del circuit breaker de INFILE y timeout adaptativo (lógica por proceso, sin red)."""
+
+    def setUp(self):
+        super().setUp()
+        self.credentials = {
+            'dbname': f'{self.env.cr.dbname}_test_breaker',
+            'company_id': self.env.company.id,
+            'breaker': dict(BREAKER_CONFIG),
+        }
+        key = (self.credentials['dbname'], self.credentials['company_id'])
+        self.addCleanup(utils._infile_breakers.pop, key, None)
+        self.breaker = _l10n_gt_edi_get_circuit_breaker(self.credentials)
+
+    def _elapse(self, seconds):
+        """Simula el paso del tiempo desde que se abrió el circuito."""
+        self.breaker.opened_at -= seconds
+
+    def _open_breaker(self):
+        for _i in range(BREAKER_CONFIG['min_calls']):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False, 100)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_opens_after_error_threshold(self):
+        # Por debajo de min_calls no se evalúa el umbral
+        for _i in range(BREAKER_CONFIG['min_calls'] - 1):
+            self.breaker.record(False, 100)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record(False, 100)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_stays_closed_below_threshold(self):
+        for success in (True, True, True, False, True, False):
+            self.breaker.record(success, 100)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_allows_a_single_trial(self):
+        self._open_breaker()
+        self._elapse(BREAKER_CONFIG['open_seconds'] - 1)
+        self.assertFalse(self.breaker.allow())
+        self._elapse(1)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertFalse(self.breaker.allow(), "Solo pasa una llamada de prueba a la vez")
+
+    def test_half_open_success_closes(self):
+        self._open_breaker()
+        self._elapse(BREAKER_CONFIG['open_seconds'])
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True, 100)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.snapshot()['calls'], 0)
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_failure_reopens(self):
+        self._open_breaker()
+        self._elapse(BREAKER_CONFIG['open_seconds'])
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 100)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_manual_reset_from_other_process(self):
+        self._open_breaker()
+        # Otro proceso pulsó "Cerrar Circuito": llega con las credenciales
+        self.credentials['breaker']['reset_at'] = '2024-05-13T10:00:00'
+        breaker = _l10n_gt_edi_get_circuit_breaker(self.credentials)
+        self.assertIs(breaker, self.breaker)
+        self.assertEqual(breaker.state, 'closed')
+        # El mismo cierre no se vuelve a aplicar
+        self._open_breaker()
+        _l10n_gt_edi_get_circuit_breaker(self.credentials)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_adaptive_timeout(self):
+        # Sin suficientes llamadas exitosas: timeout máximo
+        self.assertEqual(self.breaker.timeout(), BREAKER_CONFIG['timeout_max'])
+        for latency in (1000, 1000, 1000, 2000):
+            self.breaker.record(True, latency)
+        # p95 de 4 latencias = la mayor (2000 ms)
+        self.assertEqual(self.breaker.timeout(), 2000 * TIMEOUT_FACTOR / 1000)
+        # Acotado entre timeout_min y timeout_max
+        self.breaker.calls.clear()
+        for _i in range(4):
+            self.breaker.record(True, 10)
+        self.assertEqual(self.breaker.timeout(), BREAKER_CONFIG['timeout_min'])
+        for _i in range(4):
+            self.breaker.record(True, 60000)
+        self.assertEqual(self.breaker.timeout(), BREAKER_CONFIG['timeout_max'])
+
+    def test_unexpected_error_ends_half_open_trial(self):
+        self._open_breaker()
+        self._elapse(BREAKER_CONFIG['open_seconds'])
+        session = MagicMock()
+        session.request.side_effect = ValueError("respuesta inválida")
+        with patch.object(utils, '_l10n_gt_edi_get_infile_session', return_value=session):
+            with self.assertRaises(ValueError):
+                _l10n_gt_edi_infile_request(self.credentials, 'POST', 'http://infile.test', headers={})
+        # La prueba fallida reabre el circuito en lugar de dejarlo bloqueado en half_open
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.trial_running)
+        with self.assertRaises(InfileCircuitOpenError):
+            _l10n_gt_edi_infile_request(self.credentials, 'POST', 'http://infile.test', headers={})
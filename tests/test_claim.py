@@ -0,0 +1,91 @@
+from odoo import Command
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.account_move import CLAIM_STALE_MINUTES
+
+
+@tagged('post_install', '-at_install')
+class TestClaimForCertification(AccountTestInvoicingCommon):
+    """
+    Reclamo de facturas para certificar. SKIP LOCKED no se puede ejercitar dentro de
+    la transacción del test: el reclamo de otro proceso se simula con
+    l10n_gt_edi_claimed_at reciente.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.invoices = cls.env['account.move'].create([
+            cls._prepare_invoice_vals() for _i in range(3)
+        ])
+        cls.invoices.with_context(skip_fel_wizard=True).action_post()
+        cls.draft = cls.env['account.move'].create(cls._prepare_invoice_vals())
+
+    @classmethod
+    def _prepare_invoice_vals(cls):
+        return {
+            'move_type': 'out_invoice',
+            'partner_id': cls.partner_a.id,
+            'invoice_date': '2024-05-13',
+            'invoice_line_ids': [Command.create({'product_id': cls.product_a.id, 'price_unit': 100.0})],
+        }
+
+    def _claim(self, moves, **kwargs):
+        return self.env['account.move']._l10n_gt_edi_claim_for_certification(move_ids=moves.ids, **kwargs)
+
+    def _set_claimed_minutes_ago(self, moves, minutes):
+        self.env.cr.execute("""
+            UPDATE account_move
+               SET l10n_gt_edi_claimed_at = (NOW() AT TIME ZONE 'UTC') - make_interval(mins => %s)
+             WHERE id = ANY(%s)
+        """, [minutes, moves.ids])
+        moves.invalidate_recordset(['l10n_gt_edi_claimed_at'])
+
+    def test_claim_marks_moves(self):
+        claimed = self._claim(self.invoices)
+        self.assertEqual(claimed, self.invoices)
+        self.assertTrue(all(claimed.mapped('l10n_gt_edi_claimed_at')))
+
+    def test_claim_limit_in_id_order(self):
+        claimed = self._claim(self.invoices, limit=2)
+        self.assertEqual(claimed, self.invoices.sorted('id')[:2])
+
+    def test_claimed_by_other_process_is_skipped(self):
+        first = self._claim(self.invoices[:1])
+        self.assertEqual(first, self.invoices[:1])
+        # Otro worker ya la tiene: se omite en lugar de esperar
+        self.assertEqual(self._claim(self.invoices), self.invoices[1:])
+        self.assertFalse(self._claim(self.invoices))
+
+    def test_release_claim(self):
+        claimed = self._claim(self.invoices)
+        claimed._l10n_gt_edi_release_claim()
+        self.assertFalse(any(self.invoices.mapped('l10n_gt_edi_claimed_at')))
+        self.assertEqual(self._claim(self.invoices), self.invoices)
+
+    def test_stale_claim_is_reclaimed(self):
+        self._set_claimed_minutes_ago(self.invoices[:1], CLAIM_STALE_MINUTES - 1)
+        self._set_claimed_minutes_ago(self.invoices[1:2], CLAIM_STALE_MINUTES + 1)
+        # Un reclamo más viejo que CLAIM_STALE_MINUTES es de un proceso que murió
+        self.assertEqual(self._claim(self.invoices), self.invoices[1:])
+
+    def test_certifiable_only(self):
+        self.assertFalse(self._claim(self.draft))
+        self.assertEqual(self._claim(self.draft, certifiable_only=False), self.draft)
+
+    def test_certified_move_is_skipped(self):
+        sent, cancelled, failed = self.invoices
+        self.env['l10n_gt_edi.document'].create([
+            {'invoice_id': sent.id, 'state': 'invoice_sent'},
+            {'invoice_id': cancelled.id, 'state': 'invoice_cancelled'},
+            {'invoice_id': failed.id, 'state': 'invoice_sending_failed'},
+        ])
+        self.assertEqual(self._claim(self.invoices), failed)
+        # Sin filtro de certificables se reclama igual; try_send lo rechaza después
+        self.assertEqual(self._claim(sent | cancelled, certifiable_only=False), sent | cancelled)
+
+    def test_company_filter(self):
+        other_company = self.env['res.company'].create({'name': "FEL Reclamo"})
+        self.assertFalse(self._claim(self.invoices, company_ids=other_company.ids))
+        self.assertEqual(self._claim(self.invoices, company_ids=self.invoices.company_id.ids), self.invoices)
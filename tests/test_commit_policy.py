@@ -0,0 +1,49 @@
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.account_move import DEFAULT_COMMIT_EVERY
+
+
+@tagged('post_install', '-at_install')
+class TestCommitPolicy(TransactionCase):
+    """Resolución de la política de confirmación de la certificación masiva."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env['res.company'].create({'name': "FEL Confirmación"})
+
+    def _get_policy(self, **context):
+        Move = self.env['account.move'].with_company(self.company)
+        return Move.with_context(**context)._l10n_gt_edi_get_commit_policy()
+
+    def test_default_policy(self):
+        self.assertEqual(self.company.l10n_gt_edi_commit_policy, 'invoice')
+        self.assertEqual(self.company.l10n_gt_edi_commit_every, DEFAULT_COMMIT_EVERY)
+        self.assertEqual(self._get_policy(), ('invoice', DEFAULT_COMMIT_EVERY))
+
+    def test_company_policy(self):
+        self.company.write({'l10n_gt_edi_commit_policy': 'every_n', 'l10n_gt_edi_commit_every': 10})
+        self.assertEqual(self._get_policy(), ('every_n', 10))
+        self.company.l10n_gt_edi_commit_policy = 'batch'
+        self.assertEqual(self._get_policy(), ('batch', 10))
+
+    def test_commit_every_fallback(self):
+        self.company.write({'l10n_gt_edi_commit_policy': 'every_n', 'l10n_gt_edi_commit_every': 0})
+        self.assertEqual(self._get_policy(), ('every_n', DEFAULT_COMMIT_EVERY))
+        self.company.l10n_gt_edi_commit_every = -5
+        self.assertEqual(self._get_policy(), ('every_n', 1))
+
+    def test_context_overrides_company(self):
+        self.company.l10n_gt_edi_commit_policy = 'batch'
+        self.assertEqual(self._get_policy(l10n_gt_edi_commit_policy='invoice')[0], 'invoice')
+        self.assertEqual(self._get_policy(l10n_gt_edi_commit_policy='none')[0], 'none')
+
+    def test_no_commit_context(self):
+        self.company.l10n_gt_edi_commit_policy = 'every_n'
+        self.assertEqual(self._get_policy(l10n_gt_edi_no_commit=True)[0], 'none')
+        # Una política explícita en el contexto tiene prioridad
+        self.assertEqual(
+            self._get_policy(l10n_gt_edi_no_commit=True, l10n_gt_edi_commit_policy='batch')[0],
+            'batch',
+        )
+
@@ -0,0 +1,203 @@
+import logging
+import os
+import time
+import uuid
+
+from odoo import fields, Command
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.account_move import EMPRESAS_ADENDA
+
+# Campos legacy (fel_gt/fel_infile/Studio) que se llenan en los documentos de origen de NC/ND
+LEGACY_UUID_FIELDS = ('firma_fel', 'uuid_fel')
+LEGACY_SERIES_FIELDS = ('x_studio_serie', 'serie_fel', 'invoice_series')
+LEGACY_NUMBER_FIELDS = ('x_studio_nmero_de_dte', 'numero_fel', 'invoice_number')
+
+# Etapas reportadas (campos de l10n_gt_edi.send.metric)
+BENCHMARK_STAGES = (
+    'validation_ms', 'values_ms', 'render_ms', 'transform_ms',
+    'serialize_ms', 'http_ms', 'document_ms', 'total_ms',
+)
+
+DEFAULT_BENCHMARK_VOLUME = 50
+
+
+@tagged('post_install', '-at_install', 'fel_benchmark')
+class TestFelBenchmark(TransactionCase):
+    """
+    Mide la ruta completa de _l10n_gt_edi_try_send en modo DEMO con facturas sintéticas.
+    Pensado para correr sobre una copia de producción; la transacción del test se
+    revierte al final y no deja datos ni credenciales DEMO en la base.
+
+    Uso:
+        FEL_BENCHMARK_VOLUME=500 odoo-bin -d <base> --test-tags fel_benchmark --stop-after-init
+
+    El volumen (facturas por escenario) se toma de la variable de entorno
+    FEL_BENCHMARK_VOLUME o del parámetro de sistema l10n_gt_edi.benchmark_volume;
+    FEL_BENCHMARK_BATCH=1 usa _l10n_gt_edi_try_send_batch.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.volume = int(
+            os.environ.get('FEL_BENCHMARK_VOLUME')
+            or cls.env['ir.config_parameter'].sudo().get_param(
+                'l10n_gt_edi.benchmark_volume', DEFAULT_BENCHMARK_VOLUME)
+        )
+        cls.batch = os.environ.get('FEL_BENCHMARK_BATCH') == '1'
+        cls.gt_companies = cls.env['res.company'].search([('account_fiscal_country_id.code', '=', 'GT')])
+
+    # =========================================================================
+    # ESCENARIOS
+    # =========================================================================
+
+    def test_benchmark_normal(self):
+        self._run_benchmark('normal')
+
+    def test_benchmark_export(self):
+        self._run_benchmark('export')
+
+    def test_benchmark_ncre(self):
+        self._run_benchmark('ncre')
+
+    def test_benchmark_ndeb(self):
+        self._run_benchmark('ndeb')
+
+    def test_benchmark_adenda(self):
+        self._run_benchmark('adenda')
+
+    def _run_benchmark(self, scenario):
+        company = self._get_company(scenario)
+        if not company:
+            self.skipTest(f"No hay compañía aplicable para el escenario {scenario}")
+        self._setup_demo_company(company)
+
+        env = self.env(context=dict(self.env.context, allowed_company_ids=company.ids))
+        moves = self._create_moves(env, scenario, company)
+        moves.with_context(skip_fel_wizard=True).action_post()
+        moves = moves.with_context(l10n_gt_edi_commit_policy='none')
+
+        start = time.perf_counter()
+        if self.batch:
+            moves._l10n_gt_edi_try_send_batch()
+        else:
+            for move in moves:
+                move._l10n_gt_edi_try_send()
+        self.env.flush_all()
+        seconds = time.perf_counter() - start
+
+        metrics = self.env['l10n_gt_edi.send.metric'].search([('move_id', 'in', moves.ids)])
+        result = {
+            'count': len(moves),
+            'seconds': seconds,
+            'invoices_per_second': len(moves) / seconds if seconds else 0.0,
+            'sent': len(moves.filtered(lambda m: m.l10n_gt_edi_state == 'invoice_sent')),
+        }
+        for stage in BENCHMARK_STAGES:
+            result[stage] = sum(metrics.mapped(stage)) / len(metrics) if metrics else 0.0
+        self._log_result(scenario, result)
+        self.assertEqual(result['sent'], result['count'], "Todas las facturas deben certificarse en modo DEMO")
+
+    # =========================================================================
+    # DATOS SINTÉTICOS
+    # =========================================================================
+
+    def _get_company(self, scenario):
+        if scenario == 'adenda':
+            return self.gt_companies.filtered(lambda c: c.id in EMPRESAS_ADENDA)[:1]
+        return (self.env.company & self.gt_companies) or self.gt_companies[:1]
+
+    def _setup_demo_company(self, company):
+        """Pone en modo DEMO la compañía certificadora y activa las métricas (se revierte con el test)."""
+        root_company = company._l10n_gt_edi_get_certifying_company()
+        root_company.l10n_gt_edi_service_provider = 'demo'
+        company.sudo().l10n_gt_edi_collect_metrics = True
+        # El ormcache de _l10n_gt_edi_get_static_fel_data queda con credenciales DEMO
+        self.addCleanup(self.env.registry.clear_cache)
+
+    def _create_moves(self, env, scenario, company):
+        journal = env['account.journal'].search([
+            *env['account.journal']._check_company_domain(company),
+            ('type', '=', 'sale'),
+        ], limit=1)
+        partner = self._create_partner(env, scenario)
+        base_vals = {
+            'move_type': 'out_invoice',
+            'company_id': company.id,
+            'journal_id': journal.id,
+            'partner_id': partner.id,
+            'invoice_date': fields.Date.context_today(partner),
+            'ref': f"Benchmark {scenario}",
+            'invoice_line_ids': [Command.create({
+                'name': f"Benchmark {scenario}",
+                'quantity': 1,
+                'price_unit': 100.0,
+                'tax_ids': [Command.set(company.account_sale_tax_id.ids)],
+            })],
+        }
+        if scenario == 'export':
+            base_vals['fiscal_position_id'] = env['account.fiscal.position'].create({
+                'name': "Exportación (Benchmark)",
+                'company_id': company.id,
+                'l10n_gt_edi_is_export': True,
+            }).id
+
+        if scenario not in ('ncre', 'ndeb'):
+            return env['account.move'].create([base_vals] * self.volume)
+
+        # NC/ND: documentos de origen certificados con el módulo legacy
+        origins = env['account.move'].create([base_vals] * self.volume)
+        origins.with_context(skip_fel_wizard=True).action_post()
+        self._fill_legacy_fel_fields(origins)
+        if scenario == 'ncre':
+            return origins._reverse_moves([{'ref': "Benchmark NC"}] * self.volume)
+        return env['account.move'].create([
+            {**base_vals, 'debit_origin_id': origin.id, 'ref': "Benchmark ND"}
+            for origin in origins
+        ])
+
+    def _create_partner(self, env, scenario):
+        if scenario == 'export':
+            return env['res.partner'].create({
+                'name': "Benchmark Exportación",
+                'is_company': True,
+                'country_id': env.ref('base.us').id,
+                'street': "1 Benchmark Ave",
+                'city': "Miami",
+                'vat': "123456789",
+            })
+        return env['res.partner'].create({
+            'name': "Benchmark Cliente",
+            'is_company': True,
+            'country_id': env.ref('base.gt').id,
+            'street': "Zona 1",
+            'city': "Guatemala",
+            'vat': "CF",
+        })
+
+    def _fill_legacy_fel_fields(self, moves):
+        """Simula facturas certificadas con fel_gt: UUID, serie y número en campos legacy."""
+        Move = self.env['account.move']
+        uuid_field = next((f for f in LEGACY_UUID_FIELDS if f in Move._fields), None)
+        series_field = next((f for f in LEGACY_SERIES_FIELDS if f in Move._fields), None)
+        number_field = next((f for f in LEGACY_NUMBER_FIELDS if f in Move._fields), None)
+        if not (uuid_field and series_field and number_field):
+            # Sin campos legacy en esta base: certificar el origen en DEMO (ruta nativa)
+            logging.info("FEL Benchmark: Sin campos legacy, los orígenes se certifican en modo DEMO")
+            for move in moves.with_context(l10n_gt_edi_commit_policy='none'):
+                move._l10n_gt_edi_try_send()
+            return
+        for index, move in enumerate(moves):
+            move.write({
+                uuid_field: str(uuid.uuid4()).upper(),
+                series_field: "BENCH",
+                number_field: str(index + 1),
+            })
+
+    def _log_result(self, scenario, result):
+        logging.info(
+            "FEL Benchmark: %-8s %5d facturas en %7.2f s (%6.1f fact/s, %d certificadas) | %s",
+            scenario, result['count'], result['seconds'], result['invoices_per_second'], result['sent'],
+            ', '.join(f"{stage[:-3]}={result[stage]:.1f}ms" for stage in BENCHMARK_STAGES),
+        )
@@ -0,0 +1,87 @@
+import base64
+from datetime import datetime
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.utils import _l10n_gt_edi_parse_certification_response
+
+CERTIFIED_XML = b'<?xml version="1.0" encoding="UTF-8"?><dte:GTDocumento xmlns:dte="http://www.sat.gob.gt/dte/fel/0.2.0" Version="0.1"/>'
+
+# Respuesta de certificación de INFILE (formato de su API REST de certificación)
+INFILE_CERTIFIED_RESPONSE = {
+    'resultado': True,
+    'fecha': '2024-05-13T10:15:30.8640962-06:00',
+    'origen': 'Certificador',
+    'descripcion': 'El documento se certificó correctamente',
+    'control_emision': {'Saldo': 9876, 'Creditos': 10000},
+    'alertas_infile': False,
+    'descripcion_alertas_infile': [],
+    'alertas_sat': False,
+    'descripcion_alertas_sat': [],
+    'cantidad_errores': 0,
+    'descripcion_errores': [],
+    'informacion_adicional': '',
+    'uuid': '8D1D2A8E-6C1B-4F5A-9E77-3B6C0E2F1A90',
+    'serie': '8D1D2A8E',
+    'numero': '1813727066',
+    'xml_certificado': base64.b64encode(CERTIFIED_XML).decode(),
+}
+
+INFILE_REJECTED_RESPONSE = {
+    'resultado': False,
+    'fecha': '2024-05-13T10:15:30-06:00',
+    'origen': 'Validaciones XSD SAT',
+    'descripcion': 'Se encontraron errores en el documento',
+    'cantidad_errores': 1,
+    'descripcion_errores': [{
+        'resultado': False,
+        'fuente': 'SAT',
+        'categoria': 'Validación de NIT',
+        'numeral': '3.1',
+        'validacion': 'El NIT del receptor debe ser válido',
+        'mensaje_error': 'El NIT del receptor no es válido',
+    }],
+    'uuid': '',
+    'serie': '',
+    'numero': '',
+    'xml_certificado': '',
+}
+
+
+@tagged('post_install', '-at_install')
+class TestInfileResponse(TransactionCase):
+    """
+    Conversión de la respuesta de INFILE al formato de l10n_gt_edi. No se compara
+    con el módulo base (su análisis no está separado de la petición HTTP): el parser
+    se mantiene sincronizado a mano con _l10n_gt_edi_send_to_sat.
+    """
+
+    def test_parse_certified_response(self):
+        result = _l10n_gt_edi_parse_certification_response(INFILE_CERTIFIED_RESPONSE)
+        self.assertEqual(result['uuid'], INFILE_CERTIFIED_RESPONSE['uuid'])
+        self.assertEqual(result['series'], INFILE_CERTIFIED_RESPONSE['serie'])
+        self.assertEqual(result['serial_number'], INFILE_CERTIFIED_RESPONSE['numero'])
+        # Hora de Guatemala (-06:00) convertida a UTC sin zona, como los Datetime de Odoo
+        self.assertEqual(result['certification_date'], datetime(2024, 5, 13, 16, 15, 30, 864096))
+        self.assertEqual(result['xml'], CERTIFIED_XML)
+        self.assertNotIn('errors', result)
+
+    def test_parse_rejected_response(self):
+        result = _l10n_gt_edi_parse_certification_response(INFILE_REJECTED_RESPONSE)
+        self.assertEqual(result, {'errors': ['El NIT del receptor no es válido']})
+
+    def test_parse_rejected_response_without_details(self):
+        result = _l10n_gt_edi_parse_certification_response({
+            **INFILE_REJECTED_RESPONSE,
+            'descripcion_errores': [],
+        })
+        self.assertEqual(result, {'errors': ['Se encontraron errores en el documento']})
+
+    def test_parse_response_with_unexpected_date(self):
+        result = _l10n_gt_edi_parse_certification_response({
+            **INFILE_CERTIFIED_RESPONSE,
+            'fecha': '13/05/2024 10:15:30',
+        })
+        # Se usa la hora actual en lugar de fallar
+        self.assertTrue(result['certification_date'])
+        self.assertEqual(result['uuid'], INFILE_CERTIFIED_RESPONSE['uuid'])
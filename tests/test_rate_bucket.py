@@ -0,0 +1,109 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestRateBucket(TransactionCase):
+    """
+    Token bucket de peticiones a INFILE. En el test, registry.cursor() comparte la
+    transacción del test, así que los turnos tomados se revierten al final.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Bucket = cls.env['l10n_gt_edi.rate.bucket']
+        cls.company = cls.env['res.company'].create({'name': "FEL Límite A"})
+        cls.other_company = cls.env['res.company'].create({'name': "FEL Límite B"})
+
+    def _payload(self, key, company, limits, service_provider='production'):
+        return {
+            'key': key,
+            'credentials': {
+                'company_id': company.id,
+                'service_provider': service_provider,
+                'rate_limit': limits,
+            },
+        }
+
+    def _runner(self, batches):
+        def runner(payloads):
+            batches.append([payload['key'] for payload in payloads])
+            return [{'key': payload['key']} for payload in payloads]
+        return runner
+
+    # =========================================================================
+    # _acquire
+    # =========================================================================
+
+    def test_acquire_grants_up_to_burst(self):
+        limits = {'rate': 0.001, 'burst': 3, 'max_wait': 0}
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 5), 3)
+        # Con 0.001 turnos/s la reposición tarda más que la espera máxima
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 1), 0)
+
+    def test_acquire_grants_only_requested(self):
+        limits = {'rate': 0.001, 'burst': 5, 'max_wait': 0}
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 2), 2)
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 5), 3)
+        bucket = self.Bucket.search([('company_id', '=', self.company.id)])
+        self.assertEqual(len(bucket), 1)
+        self.assertLess(bucket.tokens, 1)
+
+    def test_acquire_is_per_company(self):
+        limits = {'rate': 0.001, 'burst': 1, 'max_wait': 0}
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 1), 1)
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 1), 0)
+        self.assertEqual(self.Bucket._acquire(self.other_company.id, limits, 1), 1)
+
+    def test_acquire_waits_for_refill(self):
+        limits = {'rate': 100, 'burst': 1, 'max_wait': 5}
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 1), 1)
+        # Sin turnos: espera ~10 ms a que se reponga uno en lugar de rechazar
+        self.assertEqual(self.Bucket._acquire(self.company.id, limits, 1), 1)
+
+    # =========================================================================
+    # _run_rate_limited
+    # =========================================================================
+
+    def test_run_rate_limited_keeps_order(self):
+        limits = {'rate': 100, 'burst': 2, 'max_wait': 5}
+        payloads = [
+            self._payload('a1', self.company, limits),
+            self._payload('demo', self.company, limits, service_provider='demo'),
+            self._payload('a2', self.company, limits),
+            self._payload('b1', self.other_company, None),
+            self._payload('a3', self.company, limits),
+            self._payload('a4', self.company, limits),
+            self._payload('a5', self.company, limits),
+        ]
+        batches = []
+        results = self.Bucket._run_rate_limited(payloads, self._runner(batches))
+
+        self.assertEqual([result['key'] for result in results], [payload['key'] for payload in payloads])
+        # Los envíos sin límite (DEMO o sin rate_limit) van juntos y sin esperar
+        self.assertEqual(batches[0], ['demo', 'b1'])
+        limited_batches = batches[1:]
+        self.assertTrue(all(len(batch) <= limits['burst'] for batch in limited_batches))
+        self.assertEqual(sum(limited_batches, []), ['a1', 'a2', 'a3', 'a4', 'a5'])
+
+    def test_run_rate_limited_defers_when_exhausted(self):
+        limits = {'rate': 0.001, 'burst': 1, 'max_wait': 0}
+        payloads = [self._payload(f'a{index}', self.company, limits) for index in range(3)]
+        batches = []
+        results = self.Bucket._run_rate_limited(payloads, self._runner(batches))
+
+        self.assertEqual(batches, [['a0']])
+        self.assertEqual(results[0], {'key': 'a0'})
+        for result in results[1:]:
+            self.assertTrue(result['rate_limited'])
+            self.assertTrue(result['errors'])
+
+    def test_run_rate_limited_zero_rate_is_unlimited(self):
+        limits = {'rate': 0, 'burst': 1, 'max_wait': 0}
+        payloads = [self._payload(f'a{index}', self.company, limits) for index in range(3)]
+        batches = []
+        results = self.Bucket._run_rate_limited(payloads, self._runner(batches))
+
+        self.assertEqual(batches, [['a0', 'a1', 'a2']])
+        self.assertFalse(any(result.get('rate_limited') for result in results))
+        self.assertFalse(self.Bucket.search([('company_id', '=', self.company.id)]))
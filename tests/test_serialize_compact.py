@@ -0,0 +1,71 @@
+from lxml import etree
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.adroc_l10n_gt_edi_adenda.models.utils import (
+    _l10n_gt_edi_pretty_xml,
+    _l10n_gt_edi_serialize_compact,
+)
+
+# Fragmento con la indentación de la plantilla QWeb y texto con espacios significativos
+TEMPLATE_XML = """<dte:GTDocumento xmlns:dte="http://www.sat.gob.gt/dte/fel/0.2.0" Version="0.1">
+    <dte:SAT ClaseDocumento="dte">
+        <dte:DTE ID="DatosCertificados">
+            <dte:Emisor NITEmisor="12345678" NombreEmisor="Compañía  Ñandú, S.A.">
+                <dte:DireccionEmisor>
+                    <dte:Direccion> 5a. Avenida 1-23, Zona 1 </dte:Direccion>
+                    <dte:CodigoPostal>01001</dte:CodigoPostal>
+                </dte:DireccionEmisor>
+            </dte:Emisor>
+            <dte:Item NumeroLinea="1">
+                <dte:Descripcion>Café   molido &amp; tostado</dte:Descripcion>
+                <dte:Vacio></dte:Vacio>
+            </dte:Item>
+        </dte:DTE>
+    </dte:SAT>
+</dte:GTDocumento>
+"""
+
+
+@tagged('post_install', '-at_install')
+class TestSerializeCompact(TransactionCase):
+    """Serialización compacta del XML FEL antes de enviarlo a INFILE."""
+
+    def _template_root(self):
+        return etree.fromstring(TEMPLATE_XML)
+
+    def _assert_same_tree(self, first, second):
+        self.assertEqual(first.tag, second.tag)
+        self.assertEqual(dict(first.attrib), dict(second.attrib))
+        self.assertEqual((first.text or '').strip() if len(first) else first.text or '',
+                         (second.text or '').strip() if len(second) else second.text or '')
+        self.assertEqual(len(first), len(second))
+        for first_child, second_child in zip(first, second):
+            self._assert_same_tree(first_child, second_child)
+
+    def test_serialize_compact(self):
+        content = _l10n_gt_edi_serialize_compact(self._template_root())
+        self.assertIsInstance(content, bytes)
+        self.assertTrue(content.startswith(b"<?xml version='1.0' encoding='UTF-8'?>"))
+        body = content.split(b'?>', 1)[1].lstrip(b'\n')
+        self.assertNotIn(b'\n', body)
+        self.assertNotIn(b'>    <', body)
+        # El texto de las hojas y los atributos se conservan tal cual
+        self.assertIn('<dte:Direccion> 5a. Avenida 1-23, Zona 1 </dte:Direccion>'.encode(), body)
+        self.assertIn('<dte:Descripcion>Café   molido &amp; tostado</dte:Descripcion>'.encode(), body)
+        self.assertIn('NombreEmisor="Compañía  Ñandú, S.A."'.encode(), body)
+
+    def test_serialize_compact_round_trip(self):
+        content = _l10n_gt_edi_serialize_compact(self._template_root())
+        self._assert_same_tree(etree.fromstring(content), self._template_root())
+        # Volver a serializar lo ya compactado no cambia nada
+        self.assertEqual(_l10n_gt_edi_serialize_compact(etree.fromstring(content)), content)
+
+    def test_pretty_xml_round_trip(self):
+        content = _l10n_gt_edi_serialize_compact(self._template_root())
+        pretty = _l10n_gt_edi_pretty_xml(content)
+        self.assertIn(b'\n  <dte:SAT', pretty)
+        self.assertEqual(_l10n_gt_edi_serialize_compact(etree.fromstring(pretty)), content)
+
+    def test_pretty_xml_invalid_content(self):
+        self.assertEqual(_l10n_gt_edi_pretty_xml(b'no es XML'), b'no es XML')
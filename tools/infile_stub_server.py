@@ -0,0 +1,271 @@
+"""
+Servidor local que imita los endpoints de certificación y anulación de INFILE.
+
+Permite probar la ruta de red real del módulo (sesiones HTTP, pool de hilos,
+reintentos) sin el certificador: devuelve UUID/serie/número con el mismo formato
+JSON que INFILE, con latencia, tasa de errores y límite de peticiones configurables.
+
+Uso independiente:
+    python -m odoo.addons.adroc_l10n_gt_edi_adenda.tools.infile_stub_server --port 8765 \\
+        --latency lognormal:250:0.5 --error-rate 0.02 --rate-limit 20
+
+y en Odoo apuntar el parámetro del sistema l10n_gt_edi.infile_url a
+http://127.0.0.1:8765/fel/procesounificado/transaccion/v2/xml
+(--lost-response-rate prueba la recuperación de envíos sin respuesta: como INFILE,
+el stub devuelve el mismo DTE si se repite el identificador)
+
+Uso embebido (por ejemplo en un benchmark):
+    with InfileStubServer(latency='uniform:50:150', error_rate=0.1) as server:
+        ICP.set_param('l10n_gt_edi.infile_url', server.url)
+        ...
+"""
+import argparse
+import base64
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree
+
+INFILE_PATH = "/fel/procesounificado/transaccion/v2/xml"
+GT_TZ = timezone(timedelta(hours=-6))
+
+
+def parse_latency(spec):
+    """
+    Convierte una especificación de latencia en una función que devuelve segundos.
+
+    Formatos (milisegundos):
+        fixed:MS
+        uniform:MIN:MAX
+        normal:MEDIA:DESVIACION
+        lognormal:MEDIANA:SIGMA
+    """
+    if not spec:
+        return lambda: 0.0
+    kind, *args = spec.split(':')
+    args = [float(arg) for arg in args]
+    if kind == 'fixed':
+        return lambda: args[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(args[0], args[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(args[0], args[1])) / 1000
+    if kind == 'lognormal':
+        mu = math.log(args[0])
+        return lambda: random.lognormvariate(mu, args[1]) / 1000
+    raise ValueError(f"Distribución de latencia desconocida: {spec}")
+
+
+class _TokenBucket:
+    """Límite de peticiones por segundo (con ráfaga igual a la tasa)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class InfileStubServer:
+    """
+    Servidor HTTP embebible que responde como INFILE.
+
+    Args:
+        host, port: dirección de escucha (port=0 elige un puerto libre).
+        latency (str): distribución de latencia, ver parse_latency.
+        error_rate (float): fracción de peticiones con resultado=false (error de validación SAT).
+        http_error_rate (float): fracción de peticiones que responden HTTP 500.
+        rate_limit (float): peticiones por segundo antes de responder HTTP 429 (0 = sin límite).
+        lost_response_rate (float): fracción de certificaciones que se registran pero
+            responden HTTP 504, como si la respuesta se hubiera perdido.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, error_rate=0.0, http_error_rate=0.0, rate_limit=0,
+                 lost_response_rate=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.lost_response_rate = lost_response_rate
+        self.bucket = _TokenBucket(rate_limit) if rate_limit else None
+        # Respuestas por identificador: INFILE devuelve el mismo documento si se repite
+        self.certified = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0, 'certified': 0, 'cancelled': 0, 'errors': 0, 'rate_limited': 0,
+            'lost_responses': 0,
+        }
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{INFILE_PATH}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='infile_stub', daemon=True)
+        self.thread.start()
+        logging.info("INFILE stub: Escuchando en %s", self.url)
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # =========================================================================
+    # RESPUESTAS
+    # =========================================================================
+
+    def handle(self, headers, body):
+        """Devuelve (status_http, dict_json) para una petición."""
+        with self.lock:
+            self.stats['requests'] += 1
+        if self.bucket and not self.bucket.take():
+            self._count('rate_limited')
+            return 429, {'resultado': False, 'descripcion': 'Demasiadas solicitudes'}
+
+        time.sleep(self.latency())
+
+        if random.random() < self.http_error_rate:
+            self._count('errors')
+            return 500, {'resultado': False, 'descripcion': 'Error interno del certificador'}
+
+        if not headers.get('UsuarioApi') or not headers.get('LlaveApi'):
+            self._count('errors')
+            return 200, self._error("Credenciales inválidas")
+
+        try:
+            root = etree.fromstring(body)
+        except etree.XMLSyntaxError as e:
+            self._count('errors')
+            return 200, self._error(f"XML mal formado: {e}")
+
+        if random.random() < self.error_rate:
+            self._count('errors')
+            return 200, self._error("Error de validación simulado")
+
+        if etree.QName(root).localname == 'GTAnulacionDocumento':
+            self._count('cancelled')
+            return 200, self._success(body, uuid.uuid4())
+
+        identifier = headers.get('identificador') or str(uuid.uuid4())
+        with self.lock:
+            if identifier not in self.certified:
+                self.certified[identifier] = self._success(body, uuid.uuid5(uuid.NAMESPACE_OID, identifier))
+                self.stats['certified'] += 1
+            response = self.certified[identifier]
+        if random.random() < self.lost_response_rate:
+            self._count('lost_responses')
+            return 504, {'resultado': False, 'descripcion': 'Tiempo de espera agotado'}
+        return 200, response
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _success(self, body, document_uuid):
+        document_uuid = str(document_uuid).upper()
+        return {
+            'resultado': True,
+            'fecha': datetime.now(GT_TZ).isoformat(timespec='seconds'),
+            'origen': 'Certificador (stub local)',
+            'descripcion': 'Documento certificado',
+            'cantidad_errores': 0,
+            'descripcion_errores': [],
+            'uuid': document_uuid,
+            'serie': document_uuid[:8],
+            'numero': str(int(document_uuid[9:18].replace('-', ''), 16)),
+            'xml_certificado': base64.b64encode(body).decode(),
+        }
+
+    def _error(self, message):
+        return {
+            'resultado': False,
+            'fecha': datetime.now(GT_TZ).isoformat(timespec='seconds'),
+            'descripcion': 'Error',
+            'cantidad_errores': 1,
+            'descripcion_errores': [{'resultado': False, 'mensaje_error': message}],
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como INFILE
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self._respond(*server.handle(self.headers, body))
+
+            def _respond(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                logging.debug("INFILE stub: " + fmt, *args)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a INFILE")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default=None, help="fixed:MS | uniform:MIN:MAX | normal:MEDIA:DESV | lognormal:MEDIANA:SIGMA")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Peticiones por segundo (0 = sin límite)")
+    parser.add_argument('--lost-response-rate', type=float, default=0.0,
+                        help="Fracción de certificaciones registradas que responden 504")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = InfileStubServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        http_error_rate=args.http_error_rate,
+        rate_limit=args.rate_limit,
+        lost_response_rate=args.lost_response_rate,
+    )
+    server.start()
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        logging.info("INFILE stub: %s", server.stats)
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,12 @@ class L10nGtEdiCancelWizard(models.TransientModel):
     _name = 'l10n_gt_edi.cancel.wizard'
     _description = 'Wizard para anular factura FEL en INFILE'
 
-    move_id = fields.Many2one('account.move', string="Factura", required=True)
+    move_id = fields.Many2one('account.move', string="Factura")
+    move_ids = fields.Many2many('account.move', string="Facturas")
+    move_count = fields.Integer(
+        string="Número de Facturas",
+        compute='_compute_move_count',
+    )
     reason = fields.Text(
         string="Motivo de Anulación",
         required=True,
@@ -54,12 +59,15 @@ class L10nGtEdiCancelWizard(models.TransientModel):
         readonly=True
     )
 
+    @api.depends('move_id', 'move_ids')
+    def _compute_move_count(self):
+        for wizard in self:
+            wizard.move_count = len(wizard._get_moves())
+
     @api.depends('move_id')
     def _compute_fel_uuid(self):
         for wizard in self:
-            fel_doc = wizard.move_id.l10n_gt_edi_document_ids.filtered(
-                lambda d: d.state == 'invoice_sent'
-            ).sorted('id', reverse=True)[:1]
+            fel_doc = wizard.move_id._l10n_gt_edi_get_sent_document() if wizard.move_id else False
             wizard.fel_uuid = fel_doc.uuid if fel_doc else ''
             wizard.fel_series = fel_doc.series if fel_doc else ''
             wizard.fel_number = fel_doc.serial_number if fel_doc else ''
@@ -81,7 +89,40 @@ class L10nGtEdiCancelWizard(models.TransientModel):
         if len(self.reason) > 255:
             raise UserError(_("El motivo no puede exceder 255 caracteres"))
 
+        moves = self._get_moves()
+        if not moves:
+            raise UserError(_("Debe seleccionar al menos una factura"))
+
         # Ejecutar anulación
-        self.move_id._l10n_gt_edi_cancel_invoice(self.reason.strip())
+        if len(moves) == 1:
+            moves._l10n_gt_edi_cancel_invoice(self.reason.strip())
+            return {'type': 'ir.actions.act_window_close'}
+
+        summary = moves._l10n_gt_edi_cancel_invoices(self.reason.strip())
+        return self._get_summary_notification(summary)
+
+    def _get_moves(self):
+        self.ensure_one()
+        return self.move_ids or self.move_id
 
-        return {'type': 'ir.actions.act_window_close'}
+    def _get_summary_notification(self, summary):
+        """Notificación con el resumen de una anulación por lote."""
+        cancelled, failed = summary['cancelled'], summary['failed']
+        lines = [_("%(count)s facturas anuladas en INFILE.", count=len(cancelled))]
+        if failed:
+            lines.append(_("%(count)s facturas con error:", count=len(failed)))
+            lines += [
+                f"• {move.name}: {failed[move.id]}"
+                for move in self.env['account.move'].browse(list(failed))
+            ]
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Anulación FEL"),
+                'message': '\n'.join(lines),
+                'type': 'warning' if failed else 'success',
+                'sticky': bool(failed),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
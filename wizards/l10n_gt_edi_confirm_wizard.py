@@ -1,4 +1,8 @@
 from odoo import fields, models, api, _
+from odoo.tools import format_amount
+
+# Facturas por página en la vista previa del wizard
+PREVIEW_PAGE_SIZE = 50
 
 
 class L10nGtEdiConfirmWizard(models.TransientModel):
@@ -18,28 +22,98 @@ class L10nGtEdiConfirmWizard(models.TransientModel):
     )
     invoice_names = fields.Text(
         string="Facturas a certificar",
-        compute="_compute_invoice_info",
+        compute="_compute_invoice_preview",
     )
     total_amount = fields.Float(
         string="Monto Total",
         compute="_compute_invoice_info",
+        help="Solo cuando todas las facturas están en la misma moneda.",
     )
     currency_id = fields.Many2one(
         'res.currency',
         string="Moneda",
         compute="_compute_invoice_info",
     )
+    currency_count = fields.Integer(
+        string="Número de Monedas",
+        compute="_compute_invoice_info",
+    )
+    currency_totals = fields.Text(
+        string="Totales por Moneda",
+        compute="_compute_invoice_info",
+    )
+
+    # Vista previa paginada de las facturas seleccionadas
+    preview_page = fields.Integer(string="Página", default=0)
+    preview_range = fields.Char(
+        string="Mostrando",
+        compute="_compute_invoice_preview",
+    )
+    preview_has_previous = fields.Boolean(compute="_compute_invoice_preview")
+    preview_has_next = fields.Boolean(compute="_compute_invoice_preview")
 
     @api.depends('move_ids')
     def _compute_invoice_info(self):
+        """Cantidad y totales por moneda agregados en SQL (sin leer cada factura)."""
         for wizard in self:
-            wizard.invoice_count = len(wizard.move_ids)
+            groups = self.env['account.move']._read_group(
+                [('id', 'in', wizard.move_ids.ids)],
+                ['currency_id'],
+                ['__count', 'amount_total:sum'],
+            )
+            wizard.invoice_count = sum(count for _currency, count, _total in groups)
+            wizard.currency_count = len(groups)
+            wizard.currency_totals = '\n'.join(
+                f"{format_amount(self.env, total, currency)}  ({count} facturas)"
+                for currency, count, total in sorted(groups, key=lambda group: group[0].name or '')
+            )
+            if len(groups) == 1:
+                wizard.currency_id, _count, wizard.total_amount = groups[0]
+            else:
+                wizard.currency_id = False
+                wizard.total_amount = 0.0
+
+    @api.depends('move_ids', 'preview_page')
+    def _compute_invoice_preview(self):
+        """Lista de facturas de la página actual (PREVIEW_PAGE_SIZE por página)."""
+        for wizard in self:
+            total = len(wizard.move_ids)
+            offset = max(0, wizard.preview_page) * PREVIEW_PAGE_SIZE
+            moves = self.env['account.move'].search_fetch(
+                [('id', 'in', wizard.move_ids.ids)],
+                ['name', 'partner_id', 'amount_total', 'currency_id'],
+                offset=offset,
+                limit=PREVIEW_PAGE_SIZE,
+                order='id',
+            )
             wizard.invoice_names = '\n'.join([
                 f"• {m.name or 'Borrador'} - {m.partner_id.name} - {m.amount_total:,.2f} {m.currency_id.symbol}"
-                for m in wizard.move_ids
+                for m in moves
             ])
-            wizard.total_amount = sum(wizard.move_ids.mapped('amount_total'))
-            wizard.currency_id = wizard.move_ids[:1].currency_id if wizard.move_ids else False
+            wizard.preview_range = _("%(start)s-%(end)s de %(total)s",
+                                     start=offset + 1 if moves else 0, end=offset + len(moves), total=total)
+            wizard.preview_has_previous = offset > 0
+            wizard.preview_has_next = offset + len(moves) < total
+
+    def action_preview_next(self):
+        self.ensure_one()
+        self.preview_page += 1
+        return self._reopen()
+
+    def action_preview_previous(self):
+        self.ensure_one()
+        self.preview_page = max(0, self.preview_page - 1)
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+            'name': _("Confirmar Certificación FEL"),
+        }
 
     def action_confirm_with_fel(self):
         """Confirma la(s) factura(s) y certifica en FEL"""